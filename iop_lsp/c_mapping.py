@@ -7,9 +7,14 @@ Mirrors the logic from lib-common's src/iop/iop.blk:
 
 from __future__ import annotations
 
-import re
+from functools import lru_cache
 
+_UPPER = frozenset('ABCDEFGHIJKLMNOPQRSTUVWXYZ')
+_LOWER = frozenset('abcdefghijklmnopqrstuvwxyz')
+_LOWER_OR_DIGIT = _LOWER | frozenset('0123456789')
 
+
+@lru_cache(maxsize=8192)
 def camelcase_to_c(name: str) -> str:
     """Convert a CamelCase name to snake_case C identifier.
 
@@ -21,21 +26,47 @@ def camelcase_to_c(name: str) -> str:
       when preceded by another uppercase letter (e.g., HTTPCode -> http_code).
     - Lowercase everything.
     """
-    # Insert underscore between lower/digit and upper
-    s = re.sub(r'([a-z0-9])([A-Z])', r'\1_\2', name)
-    # Insert underscore between consecutive uppers followed by lower
-    s = re.sub(r'([A-Z]+)([A-Z][a-z])', r'\1_\2', s)
-    return s.lower()
+    # Fast path: no uppercase letter after the first char means there is
+    # no boundary to mark.
+    tail = name[1:]
+    if tail == tail.lower():
+        return name.lower()
+
+    out = [name[0]]
+    last = len(name) - 1
+    for i in range(1, len(name)):
+        c = name[i]
+        if c in _UPPER:
+            prev = name[i - 1]
+            if prev in _LOWER_OR_DIGIT or (
+                prev in _UPPER and i < last and name[i + 1] in _LOWER
+            ):
+                out.append('_')
+        out.append(c)
+    return ''.join(out).lower()
 
 
 def c_to_camelcase(name: str) -> str:
     """Convert a snake_case C name to CamelCase.
 
     Reverse of camelcase_to_c: my_struct_a -> MyStructA
+    Like str.capitalize() on each '_'-separated part: the first letter is
+    uppercased and the rest lowercased.
     """
-    return ''.join(part.capitalize() for part in name.split('_'))
+    out = []
+    cap = True
+    for c in name:
+        if c == '_':
+            cap = True
+        elif cap:
+            out.append(c.upper())
+            cap = False
+        else:
+            out.append(c.lower())
+    return ''.join(out)
 
 
+@lru_cache(maxsize=8192)
 def iop_type_to_c(qualified_name: str) -> str:
     """Convert an IOP qualified name to its C type base name (without suffix).
 
@@ -62,3 +93,17 @@ C_TYPE_SUFFIXES = (
     '__s',
     '__e',
 )
+_C_TYPE_SUFFIX_SET = frozenset(C_TYPE_SUFFIXES)
+
+
+def strip_c_type_suffix(c_ident: str) -> str:
+    """Strip a known C type suffix from a C identifier.
+
+    tstiop__my_struct_a__t -> tstiop__my_struct_a
+    """
+    # Every suffix starts with the only '__' it contains, so the candidate
+    # suffix is whatever follows the last '__'.
+    idx = c_ident.rfind('__')
+    if idx >= 0 and c_ident[idx:] in _C_TYPE_SUFFIX_SET:
+        return c_ident[:idx]
+    return c_ident
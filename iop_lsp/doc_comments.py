@@ -7,6 +7,10 @@ from typing import Optional
 
 from tree_sitter import Node
 
+# Per line of a doc comment body: leading whitespace plus an optional
+# '* ' or '*' continuation marker, or trailing whitespace
+_DOC_LINE_RE = re.compile(r'^[^\S\n]*(?:\* ?)?|[^\S\n]+$', re.MULTILINE)
+
 
 def get_doc_comment(node: Node) -> Optional[str]:
     """Get the doc comment preceding a definition node.
@@ -20,11 +24,12 @@ def get_doc_comment(node: Node) -> Optional[str]:
     while candidate is not None and candidate.type == 'attribute':
         candidate = candidate.prev_named_sibling
     if candidate is not None and candidate.type == 'comment':
-        text = candidate.text.decode('utf-8')
-        if (text.startswith('/**')
-                and not text.startswith('/***')
-                and not text.startswith('/**<')):
-            return _clean_doc_comment(text)
+        # Check the prefix on the raw bytes; only decode real doc comments
+        raw = candidate.text
+        if (raw.startswith(b'/**')
+                and not raw.startswith(b'/***')
+                and not raw.startswith(b'/**<')):
+            return _clean_doc_comment(raw.decode('utf-8'))
     return None
 
 
@@ -37,10 +42,10 @@ def get_trailing_doc_comment(node: Node) -> Optional[str]:
     # Look for comment among siblings after this node on same line
     sibling = node.next_named_sibling
     if sibling is not None and sibling.type == 'comment':
-        text = sibling.text.decode('utf-8')
-        if text.startswith('/**<'):
+        raw = sibling.text
+        if raw.startswith(b'/**<'):
             if sibling.start_point.row == node.end_point.row:
-                return _clean_trailing_doc_comment(text)
+                return _clean_trailing_doc_comment(raw.decode('utf-8'))
     # Also check non-named siblings (comments are extras)
     # Walk through all children of parent to find trailing comment
     if node.parent is not None:
@@ -50,10 +55,10 @@ def get_trailing_doc_comment(node: Node) -> Optional[str]:
                 found_node = True
                 continue
             if found_node and child.type == 'comment':
-                text = child.text.decode('utf-8')
-                if (text.startswith('/**<')
+                raw = child.text
+                if (raw.startswith(b'/**<')
                         and child.start_point.row == node.end_point.row):
-                    return _clean_trailing_doc_comment(text)
+                    return _clean_trailing_doc_comment(raw.decode('utf-8'))
             if found_node and child.start_point.row > node.end_point.row:
                 break
     return None
@@ -76,20 +81,14 @@ def _clean_doc_comment(text: str) -> str:
     text = text[3:]
     if text.endswith('*/'):
         text = text[:-2]
-    # Split into lines and clean each
-    lines = text.split('\n')
-    cleaned = []
-    for line in lines:
-        line = line.strip()
-        # Remove leading ' * ' or ' *'
-        if line.startswith('* '):
-            line = line[2:]
-        elif line.startswith('*'):
-            line = line[1:]
-        cleaned.append(line)
-    # Join and strip
-    result = '\n'.join(cleaned).strip()
-    return result
+    if '\n' not in text:
+        # Single-line comment, the common case: no need for the regex
+        text = text.lstrip()
+        if text.startswith('*'):
+            text = text[2:] if text.startswith('* ') else text[1:]
+        return text.strip()
+    # Strip each line, along with its leading '* ' or '*', then the whole
+    return _DOC_LINE_RE.sub('', text).strip()
 
 
 def _clean_trailing_doc_comment(text: str) -> str:
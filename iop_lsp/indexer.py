@@ -2,10 +2,15 @@
 
 from __future__ import annotations
 
+import hashlib
 import logging
 import os
+import sys
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from dataclasses import dataclass, field
-from typing import Optional
+from typing import Callable, Iterator, Optional
 
 import tree_sitter as ts
 import tree_sitter_iop as tsiop
@@ -15,7 +20,7 @@ from .doc_comments import (
     get_field_doc_comment,
     get_trailing_doc_comment,
 )
-from .c_mapping import C_TYPE_SUFFIXES, iop_type_to_c
+from .c_mapping import iop_type_to_c, strip_c_type_suffix
 from .symbols import (
     EnumValueSymbol,
     FieldSymbol,
@@ -50,6 +55,55 @@ _NODE_TYPE_TO_KIND = {
 }
 
 
+# Pre-compiled tree-sitter query for the package name and the top-level
+# definitions of a file (run with a max start depth of 1)
+_DEFINITION_QUERY = ts.Query(IOP_LANGUAGE, """
+(package_definition (identifier) @package)
+[
+  (data_structure_definition)
+  (class_definition)
+  (enum_definition)
+  (interface_definition)
+  (module_definition)
+  (typedef_definition)
+  (snmp_object_definition)
+  (snmp_table_definition)
+  (snmp_interface_definition)
+] @definition
+""")
+
+
+def _kind_ids(*type_names: str) -> dict[int, str]:
+    """Map the node kind ids of the given node types to their type names.
+
+    A type name may have several kind ids (e.g., aliased nodes); all are
+    kept, so matching on kind_id is equivalent to matching on type while
+    comparing integers instead of building a type string per node.
+    """
+    names = frozenset(type_names)
+    return {
+        kind_id: IOP_LANGUAGE.node_kind_for_id(kind_id)
+        for kind_id in range(IOP_LANGUAGE.node_kind_count)
+        if IOP_LANGUAGE.node_kind_for_id(kind_id) in names
+    }
+
+
+# Child node types looked up by the extractors, see _first_children()
+_VARIABLE_PARTS = _kind_ids(
+    'type', 'type_specifier', 'identifier', 'default_value',
+)
+_ENUM_FIELD_PARTS = _kind_ids('identifier', 'default_value')
+_RPC_PARTS = _kind_ids('identifier', 'rpc_in', 'rpc_out', 'rpc_throw')
+_RPC_CLAUSE_PARTS = _kind_ids('argument_list', 'type', 'identifier')
+_ATTRIBUTE_PARTS = _kind_ids('identifier', 'attribute_argument_list')
+
+# Block entries handled by the extractors
+_FIELD_KINDS = frozenset(_kind_ids('field'))
+_ENUM_FIELD_KINDS = frozenset(_kind_ids('enum_field'))
+_RPC_KINDS = frozenset(_kind_ids('rpc'))
+_MODULE_FIELD_KINDS = frozenset(_kind_ids('module_field'))
+
+
 def _node_range(node: ts.Node) -> Range:
     sp = node.start_point
     ep = node.end_point
@@ -63,6 +117,22 @@ def _find_child(node: ts.Node, type_name: str) -> Optional[ts.Node]:
     return None
 
 
+def _first_children(
+    node: ts.Node, kinds: dict[int, str],
+) -> dict[str, ts.Node]:
+    """Map each node type of kinds to the first child of that type.
+
+    kinds comes from _kind_ids(). Does a single pass over the children,
+    instead of one _find_child call per type.
+    """
+    found: dict[str, ts.Node] = {}
+    for child in node.children:
+        type_name = kinds.get(child.kind_id)
+        if type_name is not None and type_name not in found:
+            found[type_name] = child
+    return found
+
+
 def _find_children(node: ts.Node, type_name: str) -> list[ts.Node]:
     return [c for c in node.children if c.type == type_name]
 
@@ -73,11 +143,151 @@ def _node_text(node: Optional[ts.Node]) -> Optional[str]:
     return node.text.decode('utf-8')
 
 
+def _interned_text(node: Optional[ts.Node]) -> Optional[str]:
+    """Like _node_text, for names repeated across the workspace.
+
+    Package names, type names and references, field and enum value names
+    and specifiers recur in many symbols; interning them shares one
+    string object and speeds up dict lookups on them.
+    """
+    if node is None:
+        return None
+    return sys.intern(node.text.decode('utf-8'))
+
+
 def _find_identifier(node: ts.Node) -> Optional[ts.Node]:
     """Find the first identifier child of a node."""
     return _find_child(node, 'identifier')
 
 
+def _iter_iop_files(root_path: str) -> Iterator[str]:
+    """Yield the paths of all .iop files under root_path.
+
+    Like os.walk, symlinked directories are not followed and unreadable
+    directories are skipped silently.
+    """
+    try:
+        entries = os.scandir(root_path)
+    except OSError:
+        return
+    with entries:
+        subdirs = []
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                subdirs.append(entry.path)
+            elif entry.name.endswith('.iop') and entry.is_file():
+                yield entry.path
+    for subdir in subdirs:
+        yield from _iter_iop_files(subdir)
+
+
+_thread_local = threading.local()
+
+
+def _thread_parser() -> ts.Parser:
+    """Return this thread's parser (parsers must not be shared)."""
+    parser = getattr(_thread_local, 'parser', None)
+    if parser is None:
+        parser = _thread_local.parser = ts.Parser(IOP_LANGUAGE)
+    return parser
+
+
+def _read_source(filepath: str) -> Optional[bytes]:
+    """Read a file into bytes.
+
+    The file is not mapped: a mapping holds a file descriptor and kills
+    the server with SIGBUS if the file gets truncated meanwhile, which is
+    what editors and formatters do on save.
+    """
+    try:
+        with open(filepath, 'rb') as f:
+            return f.read()
+    except OSError as e:
+        log.warning('Cannot read %s: %s', filepath, e)
+        return None
+
+
+def extract_package(source: bytes) -> Optional[str]:
+    """Return the package declared by source, without parsing it.
+
+    Only whitespace and comments may come before the package declaration,
+    as in any valid IOP file; None is returned when it is not found there.
+    """
+    pos = 0
+    end = len(source)
+    while pos < end:
+        if source[pos:pos + 1].isspace():
+            pos += 1
+        elif source[pos:pos + 2] == b'//':
+            pos = source.find(b'\n', pos)
+            if pos < 0:
+                return None
+        elif source[pos:pos + 2] == b'/*':
+            pos = source.find(b'*/', pos + 2)
+            if pos < 0:
+                return None
+            pos += 2
+        else:
+            break
+    if (source[pos:pos + 7] != b'package'
+            or not source[pos + 7:pos + 8].isspace()):
+        return None
+    semi = source.find(b';', pos + 8)
+    if semi < 0:
+        return None
+    try:
+        name = source[pos + 8:semi].strip().decode('ascii')
+    except UnicodeDecodeError:
+        return None
+    if not all(part.isidentifier() for part in name.split('.')):
+        return None
+    return sys.intern(name)
+
+
+def _read_and_parse(filepath: str) -> Optional[tuple[bytes, ts.Tree]]:
+    """Read and parse a file; runs on index_workspace's worker threads."""
+    source = _read_source(filepath)
+    if source is None:
+        return None
+    return source, _thread_parser().parse(source)
+
+
+# Parse results index_workspace lets each worker get ahead by
+_PARSE_AHEAD = 4
+
+
+def _parse_ahead(
+    filepaths: list[str], workers: int,
+) -> Iterator[tuple[str, Optional[tuple[bytes, ts.Tree]]]]:
+    """Yield (filepath, _read_and_parse(filepath)) in filepaths order.
+
+    Files are parsed on a pool of `workers` threads, with at most
+    _PARSE_AHEAD results per worker waiting to be consumed, so memory
+    stays bounded however fast the consumer is.
+    """
+    remaining = iter(filepaths)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending: deque[tuple[str, Future]] = deque()
+
+        def submit() -> None:
+            filepath = next(remaining, None)
+            if filepath is not None:
+                pending.append(
+                    (filepath, pool.submit(_read_and_parse, filepath)),
+                )
+
+        for _ in range(workers * _PARSE_AHEAD):
+            submit()
+        while pending:
+            filepath, future = pending.popleft()
+            submit()
+            yield filepath, future.result()
+
+
+# Max cached resolve() results
+_RESOLVE_CACHE_SIZE = 4096
+
+
 @dataclass
 class SymbolIndex:
     """Index of all IOP symbols in the workspace."""
@@ -92,8 +302,18 @@ class SymbolIndex:
     by_file: dict[str, list[Symbol]] = field(default_factory=dict)
     # file path -> package name
     package_of_file: dict[str, str] = field(default_factory=dict)
+    # enum value name -> (enum symbol, value) pairs, in indexing order
+    by_enum_value: dict[
+        str, list[tuple[Symbol, EnumValueSymbol]]
+    ] = field(default_factory=dict)
     # C identifier base name -> symbol (e.g., 'tstiop__my_struct_a' -> Symbol)
+    # Built lazily by resolve_c_identifier(), only C files need it
     by_c_name: dict[str, Symbol] = field(default_factory=dict)
+    _c_names_stale: bool = field(default=False, repr=False)
+    # (name, current package) -> resolve() result, cleared on any change
+    _resolve_cache: dict[
+        tuple[str, Optional[str]], Optional[Symbol]
+    ] = field(default_factory=dict, repr=False)
 
     def resolve(
         self,
@@ -106,34 +326,55 @@ class SymbolIndex:
             name: Simple or qualified type name.
             current_package: Package of the file where reference appears.
         """
+        # Built-in types are the most common references: answer them
+        # before building a cache key
         if name in BUILTIN_TYPES:
             return None
+        key = (name, current_package)
+        try:
+            return self._resolve_cache[key]
+        except KeyError:
+            pass
+        if len(self._resolve_cache) >= _RESOLVE_CACHE_SIZE:
+            self._resolve_cache.clear()
+        sym = self._resolve(name, current_package)
+        self._resolve_cache[key] = sym
+        return sym
 
+    def _resolve(
+        self,
+        name: str,
+        current_package: Optional[str],
+    ) -> Optional[Symbol]:
         # Qualified name: pkg.TypeName
-        if '.' in name:
+        dot = name.rfind('.')
+        if dot >= 0:
             # Could be a qualified name or a dotted identifier
             sym = self.by_qualified_name.get(name)
             if sym is not None:
                 return sym
-            # Try splitting at last dot for nested package names
+            # Split at last dot for nested package names
             # e.g., 'foo.bar.Type' -> package 'foo.bar', type 'Type'
-            parts = name.rsplit('.', 1)
-            if len(parts) == 2:
-                pkg, type_name = parts
-                pkg_symbols = self.by_package.get(pkg, [])
+            pkg_symbols = self.by_package.get(name[:dot])
+            if pkg_symbols:
+                type_name = name[dot + 1:]
                 for s in pkg_symbols:
                     if s.name == type_name:
                         return s
             return None
 
         # Simple name: prefer same-package, then global
-        candidates = self.by_name.get(name, [])
+        candidates = self.by_name.get(name)
         if not candidates:
             return None
         if len(candidates) == 1:
             return candidates[0]
-        # Prefer same-package match
+        # Prefer same-package match, which is normally the symbol of the
+        # same qualified name; the scan only matters for duplicate types
         if current_package:
+            sym = self.by_qualified_name.get(f'{current_package}.{name}')
+            if sym is not None:
+                return sym
             for c in candidates:
                 if c.package == current_package:
                     return c
@@ -145,96 +386,267 @@ class SymbolIndex:
         current_package: Optional[str] = None,
     ) -> Optional[tuple[Symbol, EnumValueSymbol]]:
         """Resolve an enum value reference (e.g., LOG_LEVEL_DEFAULT)."""
-        # Search in same package first, then globally
-        if current_package:
-            for sym in self.by_package.get(current_package, []):
-                if sym.kind == SymbolKind.ENUM:
-                    for ev in sym.enum_values:
-                        if ev.name == value_name:
-                            return (sym, ev)
-        for syms in self.by_name.values():
-            for sym in syms:
-                if sym.kind == SymbolKind.ENUM:
-                    for ev in sym.enum_values:
-                        if ev.name == value_name:
-                            return (sym, ev)
-        return None
+        candidates = self.by_enum_value.get(value_name)
+        if not candidates:
+            return None
+        # Prefer same-package match
+        if current_package and len(candidates) > 1:
+            for candidate in candidates:
+                if candidate[0].package == current_package:
+                    return candidate
+        return candidates[0]
 
     def add_symbol(self, sym: Symbol) -> None:
         self.by_name.setdefault(sym.name, []).append(sym)
         self.by_qualified_name[sym.qualified_name] = sym
         self.by_package.setdefault(sym.package, []).append(sym)
         self.by_file.setdefault(sym.file, []).append(sym)
-        # Index by C name
-        c_name = iop_type_to_c(sym.qualified_name)
-        self.by_c_name[c_name] = sym
-        # Also index @ctype override if present
-        if sym.ctype:
-            ctype_base = sym.ctype
-            for suffix in C_TYPE_SUFFIXES:
-                if ctype_base.endswith(suffix):
-                    ctype_base = ctype_base[:-len(suffix)]
-                    break
-            self.by_c_name[ctype_base] = sym
+        for ev in sym.enum_values:
+            self.by_enum_value.setdefault(ev.name, []).append((sym, ev))
+        self._c_names_stale = True
+        self._resolve_cache.clear()
 
     def remove_file(self, filepath: str) -> None:
         """Remove all symbols from a file."""
         symbols = self.by_file.pop(filepath, [])
         pkg = self.package_of_file.pop(filepath, None)
+        if not symbols:
+            return
+        self._c_names_stale = True
+        self._resolve_cache.clear()
+
+        # Collect the affected buckets first so that each one is rebuilt
+        # once, however many of the file's symbols it holds
+        names: set[str] = set()
+        enum_value_names: set[str] = set()
         for sym in symbols:
-            # Remove from by_name
-            name_list = self.by_name.get(sym.name, [])
-            self.by_name[sym.name] = [
-                s for s in name_list if s.file != filepath
-            ]
-            if not self.by_name[sym.name]:
-                del self.by_name[sym.name]
+            names.add(sym.name)
+            enum_value_names.update(ev.name for ev in sym.enum_values)
             # Remove from by_qualified_name
             self.by_qualified_name.pop(sym.qualified_name, None)
-            # Remove from by_package
-            if pkg:
-                pkg_list = self.by_package.get(pkg, [])
-                self.by_package[pkg] = [
-                    s for s in pkg_list if s.file != filepath
-                ]
-                if not self.by_package[pkg]:
-                    del self.by_package[pkg]
-            # Remove from by_c_name
-            c_name = iop_type_to_c(sym.qualified_name)
-            self.by_c_name.pop(c_name, None)
-            if sym.ctype:
-                ctype_base = sym.ctype
-                for suffix in C_TYPE_SUFFIXES:
-                    if ctype_base.endswith(suffix):
-                        ctype_base = ctype_base[:-len(suffix)]
-                        break
-                self.by_c_name.pop(ctype_base, None)
+
+        # Remove from by_name
+        for name in names:
+            name_list = [
+                s for s in self.by_name.get(name, []) if s.file != filepath
+            ]
+            if name_list:
+                self.by_name[name] = name_list
+            else:
+                self.by_name.pop(name, None)
+        # Remove from by_package
+        if pkg:
+            pkg_list = [
+                s for s in self.by_package.get(pkg, [])
+                if s.file != filepath
+            ]
+            if pkg_list:
+                self.by_package[pkg] = pkg_list
+            else:
+                self.by_package.pop(pkg, None)
+        # Remove from by_enum_value
+        for ev_name in enum_value_names:
+            ev_list = [
+                c for c in self.by_enum_value.get(ev_name, [])
+                if c[0].file != filepath
+            ]
+            if ev_list:
+                self.by_enum_value[ev_name] = ev_list
+            else:
+                self.by_enum_value.pop(ev_name, None)
+
+    def replace_file(
+        self, filepath: str, package: str, symbols: list[Symbol],
+    ) -> None:
+        """Replace the symbols of a file with its freshly extracted ones.
+
+        New symbols equal to the current ones are dropped in favor of the
+        current objects, which keeps their identity and cached hover.
+        When none of the file's symbols changed, the index is not touched.
+        """
+        old_symbols = self.by_file.get(filepath)
+        if old_symbols and self.package_of_file.get(filepath) == package:
+            old_by_qname = {s.qualified_name: s for s in old_symbols}
+            kept = [old_by_qname.get(s.qualified_name) for s in symbols]
+            symbols = [
+                old if old == sym else sym
+                for old, sym in zip(kept, symbols)
+            ]
+            if (len(symbols) == len(old_symbols)
+                    and all(a is b for a, b in zip(symbols, old_symbols))):
+                return
+
+        self.remove_file(filepath)
+        self.package_of_file[filepath] = package
+        for sym in symbols:
+            self.add_symbol(sym)
 
     def resolve_c_identifier(self, c_ident: str) -> Optional[Symbol]:
         """Resolve a C identifier like 'tstiop__my_struct_a__t' to an IOP symbol."""
-        # Strip known C type suffixes
-        base = c_ident
-        for suffix in C_TYPE_SUFFIXES:
-            if base.endswith(suffix):
-                base = base[:-len(suffix)]
-                break
-        return self.by_c_name.get(base)
+        if self._c_names_stale:
+            self._build_c_names()
+        return self.by_c_name.get(strip_c_type_suffix(c_ident))
+
+    def _build_c_names(self) -> None:
+        """Rebuild by_c_name from the symbol table in a single batch."""
+        by_c_name: dict[str, Symbol] = {}
+        for sym in self.by_qualified_name.values():
+            # Symbols built outside the indexer may not have their C names
+            # precomputed yet
+            if sym.c_name is None:
+                sym.c_name = iop_type_to_c(sym.qualified_name)
+            if sym.ctype and sym.ctype_base is None:
+                sym.ctype_base = strip_c_type_suffix(sym.ctype)
+            by_c_name[sym.c_name] = sym
+            # Also index @ctype override if present
+            if sym.ctype_base:
+                by_c_name[sym.ctype_base] = sym
+        self.by_c_name = by_c_name
+        self._c_names_stale = False
+
+
+@dataclass
+class TreeEdit:
+    """A single source edit, as expected by ts.Tree.edit.
+
+    Points are (row, column) pairs, with columns counted in bytes.
+    """
+
+    start_byte: int
+    old_end_byte: int
+    new_end_byte: int
+    start_point: tuple[int, int]
+    old_end_point: tuple[int, int]
+    new_end_point: tuple[int, int]
+
+    @classmethod
+    def between(cls, old: bytes, new: bytes) -> Optional[TreeEdit]:
+        """Compute the edit turning old into new, None if they are equal.
+
+        The edit spans from the first to the last differing byte, so
+        several changes are merged into one. Offsets are moved back to
+        UTF-8 character boundaries.
+        """
+        old_len = len(old)
+        new_len = len(new)
+        prefix = _common_prefix_len(old, new)
+        if prefix == old_len == new_len:
+            return None
+        while prefix and (
+            (prefix < old_len and old[prefix] & 0xC0 == 0x80)
+            or (prefix < new_len and new[prefix] & 0xC0 == 0x80)
+        ):
+            prefix -= 1
+        suffix = _common_suffix_len(
+            old, new, min(old_len, new_len) - prefix,
+        )
+        while suffix and old[old_len - suffix] & 0xC0 == 0x80:
+            suffix -= 1
+        return cls(
+            start_byte=prefix,
+            old_end_byte=old_len - suffix,
+            new_end_byte=new_len - suffix,
+            start_point=_point_at(old, prefix),
+            old_end_point=_point_at(old, old_len - suffix),
+            new_end_point=_point_at(new, new_len - suffix),
+        )
+
+    def apply(self, tree: ts.Tree) -> None:
+        """Edit tree in place so it can be passed as old tree to parse()."""
+        tree.edit(
+            start_byte=self.start_byte,
+            old_end_byte=self.old_end_byte,
+            new_end_byte=self.new_end_byte,
+            start_point=self.start_point,
+            old_end_point=self.old_end_point,
+            new_end_point=self.new_end_point,
+        )
+
+
+def _common_prefix_len(a: bytes, b: bytes) -> int:
+    """Length of the common prefix of a and b.
+
+    Binary search over slice comparisons, so the bytes are compared in C
+    rather than one by one in Python.
+    """
+    lo, hi = 0, min(len(a), len(b))
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[lo:mid] == b[lo:mid]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+def _common_suffix_len(a: bytes, b: bytes, limit: int) -> int:
+    """Length of the common suffix of a and b, at most limit."""
+    a_len = len(a)
+    b_len = len(b)
+    lo, hi = 0, limit
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[a_len - mid:a_len - lo] == b[b_len - mid:b_len - lo]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+def _point_at(source: bytes, offset: int) -> tuple[int, int]:
+    """(row, byte column) of a byte offset in source."""
+    row = source.count(b'\n', 0, offset)
+    return row, offset - (source.rfind(b'\n', 0, offset) + 1)
 
 
 class Indexer:
     """Indexes .iop files in a workspace."""
 
     def __init__(self) -> None:
-        self.parser = ts.Parser(IOP_LANGUAGE)
+        # Indexers created on the same thread share its parser; like the
+        # parser, an Indexer must only be used from one thread at a time
+        self.parser = _thread_parser()
         self.index = SymbolIndex()
-
-    def index_workspace(self, root_path: str) -> None:
-        """Recursively find and index all .iop files under root_path."""
-        for dirpath, _dirnames, filenames in os.walk(root_path):
-            for fname in filenames:
-                if fname.endswith('.iop'):
-                    filepath = os.path.join(dirpath, fname)
-                    self.index_file(filepath)
+        # file path -> (source, tree) last parsed by index_source, reused
+        # as the old tree for incremental re-parses
+        self._trees: dict[str, tuple[bytes, ts.Tree]] = {}
+        # file path -> digest of the source last indexed by index_file or
+        # index_source
+        self._source_hashes: dict[str, bytes] = {}
+
+    def index_workspace(
+        self,
+        root_path: str,
+        progress: Optional[Callable[[int, int], None]] = None,
+        workers: Optional[int] = None,
+    ) -> None:
+        """Recursively find and index all .iop files under root_path.
+
+        Files are read and parsed on a pool of `workers` threads, one
+        per CPU by default (tree-sitter releases the GIL while parsing);
+        symbols are extracted on the calling thread, in file order, as
+        parse results come in (see _parse_ahead()).
+
+        If given, progress is called with (indexed, total) file counts
+        after each file.
+        """
+        filepaths = [
+            os.path.abspath(p) for p in _iter_iop_files(root_path)
+        ]
+        total = len(filepaths)
+        for done, (filepath, parsed) in enumerate(_parse_ahead(
+            filepaths, workers or os.cpu_count() or 1,
+        ), 1):
+            # What index_source/index_file last saw is no longer indexed
+            self._trees.pop(filepath, None)
+            self._source_hashes.pop(filepath, None)
+            if parsed is None:
+                self.index.remove_file(filepath)
+            else:
+                source, tree = parsed
+                self._index_tree(filepath, source, tree)
+            if progress is not None:
+                progress(done, total)
         log.info(
             'Indexed %d symbols in %d files',
             len(self.index.by_qualified_name),
@@ -244,48 +656,93 @@ class Indexer:
     def index_file(self, filepath: str) -> None:
         """Parse and index a single .iop file."""
         filepath = os.path.abspath(filepath)
-        # Remove old symbols for this file first (re-index case)
-        self.index.remove_file(filepath)
-
-        try:
-            with open(filepath, 'rb') as f:
-                source = f.read()
-        except OSError as e:
-            log.warning('Cannot read %s: %s', filepath, e)
+        source = _read_source(filepath)
+        if source is None:
+            # Remove old symbols for this file (deleted file case)
+            self.index.remove_file(filepath)
+            self._trees.pop(filepath, None)
+            self._source_hashes.pop(filepath, None)
             return
 
+        if self._source_unchanged(filepath, source):
+            return
+        self._trees.pop(filepath, None)
         self._index_source(filepath, source)
 
-    def index_source(self, filepath: str, source: bytes) -> None:
-        """Index from source bytes (for open documents)."""
+    def index_source(
+        self,
+        filepath: str,
+        source: bytes,
+        edit: Optional[TreeEdit] = None,
+    ) -> None:
+        """Index from source bytes (for open documents).
+
+        The tree of the previously indexed source of this file is edited
+        and reused, so tree-sitter only re-parses the changed region.
+        The edit is computed by diffing the two sources unless given.
+        Nothing is done if the source is unchanged since the last call
+        for this file.
+        """
         filepath = os.path.abspath(filepath)
-        self.index.remove_file(filepath)
-        self._index_source(filepath, source)
+        if self._source_unchanged(filepath, source):
+            return
+        cached = self._trees.pop(filepath, None)
+        if cached is not None:
+            old_source, old_tree = cached
+            if edit is None:
+                edit = TreeEdit.between(old_source, source)
+            if edit is None:
+                tree = old_tree
+            else:
+                edit.apply(old_tree)
+                tree = self.parser.parse(source, old_tree)
+        else:
+            tree = self.parser.parse(source)
+        self._trees[filepath] = (source, tree)
+        self._index_tree(filepath, source, tree)
+
+    def _source_unchanged(self, filepath: str, source: bytes) -> bool:
+        """Tell whether source is what was last indexed for filepath.
+
+        The digest of source is recorded for the next call when it is not.
+        """
+        digest = hashlib.blake2b(source, digest_size=16).digest()
+        if (self._source_hashes.get(filepath) == digest
+                and filepath in self.index.package_of_file):
+            return True
+        self._source_hashes[filepath] = digest
+        return False
 
     def _index_source(self, filepath: str, source: bytes) -> None:
-        tree = self.parser.parse(source)
-        root = tree.root_node
+        self._index_tree(filepath, source, self.parser.parse(source))
 
-        # Extract package name
-        package = None
-        for child in root.children:
-            if child.type == 'package_definition':
-                id_node = _find_identifier(child)
-                if id_node:
-                    package = _node_text(id_node)
-                break
+    def _index_tree(
+        self, filepath: str, source: bytes, tree: ts.Tree,
+    ) -> None:
+        # Locate the package name and top-level definitions natively
+        cursor = ts.QueryCursor(_DEFINITION_QUERY)
+        cursor.set_max_start_depth(1)
+        captures = cursor.captures(tree.root_node)
 
+        # Extract package name
+        package_ids = captures.get('package')
+        if package_ids:
+            package = _interned_text(package_ids[0])
+        else:
+            # A syntax error can bury the declaration in an ERROR node
+            package = extract_package(source)
         if package is None:
             log.warning('No package declaration in %s', filepath)
+            self.index.remove_file(filepath)
             return
 
-        self.index.package_of_file[filepath] = package
-
         # Extract type definitions
-        for child in root.children:
-            sym = self._extract_symbol(child, filepath, package, source)
+        symbols = []
+        for node in captures.get('definition', ()):
+            sym = self._extract_symbol(node, filepath, package, source)
             if sym is not None:
-                self.index.add_symbol(sym)
+                symbols.append(sym)
+        self.index.replace_file(filepath, package, symbols)
 
     def _extract_symbol(
         self,
@@ -298,8 +755,21 @@ class Indexer:
         if kind is None and node.type != 'data_structure_definition':
             return None
 
+        # Collect the children we care about in a single pass
+        parts: dict[str, ts.Node] = {}
+        inheritances: list[ts.Node] = []
+        attributes: list[ts.Node] = []
+        for child in node.children:
+            child_type = child.type
+            if child_type == 'attribute':
+                attributes.append(child)
+            elif child_type == 'class_inheritance':
+                inheritances.append(child)
+            elif child_type not in parts:
+                parts[child_type] = child
+
         if node.type == 'data_structure_definition':
-            ds_type = _find_child(node, 'data_structure_type')
+            ds_type = parts.get('data_structure_type')
             if ds_type:
                 type_text = _node_text(ds_type)
                 kind = (
@@ -310,15 +780,18 @@ class Indexer:
                 return None
 
         # For typedef, the identifier is inside the variable child
+        var_parts: dict[str, ts.Node] = {}
         if node.type == 'typedef_definition':
-            var = _find_child(node, 'variable')
-            id_node = _find_identifier(var) if var else None
+            var = parts.get('variable')
+            if var:
+                var_parts = _first_children(var, _VARIABLE_PARTS)
+            id_node = var_parts.get('identifier')
         else:
-            id_node = _find_identifier(node)
+            id_node = parts.get('identifier')
         if id_node is None:
             return None
 
-        name = _node_text(id_node)
+        name = _interned_text(id_node)
         if name is None:
             return None
 
@@ -329,15 +802,16 @@ class Indexer:
         parent_class = None
         parent_class_range = None
         if node.type == 'class_definition':
-            for inh in _find_children(node, 'class_inheritance'):
+            for inh in inheritances:
                 inh_id = _find_identifier(inh)
                 if inh_id:
-                    parent_class = _node_text(inh_id)
+                    parent_class = _interned_text(inh_id)
                     parent_class_range = _node_range(inh_id)
 
         # Parse @ctype and @prefix attributes if present
-        ctype = self._extract_attr_value(node, 'ctype')
-        enum_prefix = self._extract_attr_value(node, 'prefix')
+        attr_values = self._extract_attr_values(attributes)
+        ctype = attr_values.get('ctype')
+        enum_prefix = attr_values.get('prefix')
 
         sym = Symbol(
             name=name,
@@ -352,6 +826,8 @@ class Indexer:
             full_range=_node_range(node),
             ctype=ctype,
             enum_prefix=enum_prefix,
+            c_name=iop_type_to_c(qualified_name),
+            ctype_base=strip_c_type_suffix(ctype) if ctype else None,
         )
 
         # Extract children based on kind
@@ -359,66 +835,71 @@ class Indexer:
             SymbolKind.STRUCT, SymbolKind.UNION,
             SymbolKind.SNMP_OBJ, SymbolKind.SNMP_TBL,
         ):
-            block = _find_child(node, 'data_structure_block')
+            block = parts.get('data_structure_block')
             if block:
                 sym.fields = self._extract_fields(block)
         elif kind == SymbolKind.CLASS:
-            block = _find_child(node, 'data_structure_block')
+            block = parts.get('data_structure_block')
             if block:
                 sym.fields = self._extract_fields(block)
         elif kind == SymbolKind.ENUM:
-            block = _find_child(node, 'enum_block')
+            block = parts.get('enum_block')
             if block:
                 sym.enum_values = self._extract_enum_values(block)
         elif kind == SymbolKind.INTERFACE:
-            block = _find_child(node, 'rpc_block')
+            block = parts.get('rpc_block')
             if block:
                 sym.rpcs = self._extract_rpcs(block)
         elif kind == SymbolKind.MODULE:
-            block = _find_child(node, 'module_block')
+            block = parts.get('module_block')
             if block:
                 sym.fields = self._extract_module_fields(block)
         elif kind == SymbolKind.TYPEDEF:
-            var = _find_child(node, 'variable')
-            if var:
-                type_node = _find_child(var, 'type')
-                if type_node:
-                    sym.typedef_source = _node_text(type_node)
-                    sym.typedef_source_range = _node_range(type_node)
+            type_node = var_parts.get('type')
+            if type_node:
+                sym.typedef_source = _interned_text(type_node)
+                sym.typedef_source_range = _node_range(type_node)
 
         return sym
 
-    def _extract_attr_value(
-        self, node: ts.Node, attr_name: str,
-    ) -> Optional[str]:
-        """Extract @attr_name(value) from a definition node."""
-        for child in node.children:
-            if child.type != 'attribute':
+    def _extract_attr_values(
+        self, attributes: list[ts.Node],
+    ) -> dict[str, str]:
+        """Extract {name: value} from @name(value) attribute nodes.
+
+        The first attribute with an argument wins for each name.
+        """
+        values: dict[str, str] = {}
+        for attr in attributes:
+            attr_parts = _first_children(attr, _ATTRIBUTE_PARTS)
+            attr_id = attr_parts.get('identifier')
+            arg_list = attr_parts.get('attribute_argument_list')
+            if attr_id is None or arg_list is None:
                 continue
-            attr_id = _find_child(child, 'identifier')
-            if attr_id and _node_text(attr_id) == attr_name:
-                arg_list = _find_child(child, 'attribute_argument_list')
-                if arg_list:
-                    content = _find_child(arg_list, 'attribute_content')
-                    if content:
-                        return _node_text(content).strip()
-        return None
+            attr_name = _node_text(attr_id)
+            if attr_name in values:
+                continue
+            content = _find_child(arg_list, 'attribute_content')
+            if content:
+                values[attr_name] = _node_text(content).strip()
+        return values
 
     def _extract_fields(
         self, block: ts.Node
-    ) -> list[FieldSymbol]:
+    ) -> tuple[FieldSymbol, ...]:
         fields = []
         for child in block.children:
-            if child.type == 'field':
+            if child.kind_id in _FIELD_KINDS:
                 var = _find_child(child, 'variable')
                 if var is None:
                     continue
-                type_node = _find_child(var, 'type')
-                type_spec = _find_child(var, 'type_specifier')
-                id_node = _find_identifier(var)
-                default = _find_child(var, 'default_value')
+                var_parts = _first_children(var, _VARIABLE_PARTS)
+                type_node = var_parts.get('type')
+                type_spec = var_parts.get('type_specifier')
+                id_node = var_parts.get('identifier')
+                default = var_parts.get('default_value')
 
-                type_text = _node_text(type_node)
+                type_text = _interned_text(type_node)
                 type_ref = (
                     type_text if type_text
                     and type_text not in BUILTIN_TYPES
@@ -426,9 +907,9 @@ class Indexer:
                 )
 
                 fields.append(FieldSymbol(
-                    name=_node_text(id_node) or '',
+                    name=_interned_text(id_node) or '',
                     type_ref=type_ref,
-                    specifier=_node_text(type_spec),
+                    specifier=_interned_text(type_spec),
                     default_value=_node_text(default),
                     range=_node_range(id_node) if id_node else _node_range(
                         child
@@ -437,16 +918,17 @@ class Indexer:
                     full_range=_node_range(child),
                     type_range=_node_range(type_node) if type_node else None,
                 ))
-        return fields
+        return tuple(fields)
 
     def _extract_enum_values(
         self, block: ts.Node,
-    ) -> list[EnumValueSymbol]:
+    ) -> tuple[EnumValueSymbol, ...]:
         values = []
         for child in block.children:
-            if child.type == 'enum_field':
-                id_node = _find_identifier(child)
-                default = _find_child(child, 'default_value')
+            if child.kind_id in _ENUM_FIELD_KINDS:
+                ev_parts = _first_children(child, _ENUM_FIELD_PARTS)
+                id_node = ev_parts.get('identifier')
+                default = ev_parts.get('default_value')
 
                 doc = get_field_doc_comment(child)
                 # Also check trailing comment on the enum_field
@@ -454,7 +936,7 @@ class Indexer:
                     doc = get_trailing_doc_comment(child)
 
                 values.append(EnumValueSymbol(
-                    name=_node_text(id_node) or '',
+                    name=_interned_text(id_node) or '',
                     value=(
                         _node_text(default).lstrip('= ').strip()
                         if default else None
@@ -465,18 +947,19 @@ class Indexer:
                     doc=doc,
                     full_range=_node_range(child),
                 ))
-        return values
+        return tuple(values)
 
-    def _extract_rpcs(self, block: ts.Node) -> list[RpcSymbol]:
+    def _extract_rpcs(self, block: ts.Node) -> tuple[RpcSymbol, ...]:
         rpcs = []
         for child in block.children:
-            if child.type == 'rpc':
-                id_node = _find_identifier(child)
+            if child.kind_id in _RPC_KINDS:
+                rpc_parts = _first_children(child, _RPC_PARTS)
+                id_node = rpc_parts.get('identifier')
                 doc = get_doc_comment(child)
 
-                rpc_in = _find_child(child, 'rpc_in')
-                rpc_out = _find_child(child, 'rpc_out')
-                rpc_throw = _find_child(child, 'rpc_throw')
+                rpc_in = rpc_parts.get('rpc_in')
+                rpc_out = rpc_parts.get('rpc_out')
+                rpc_throw = rpc_parts.get('rpc_throw')
 
                 in_type, in_type_range = self._extract_rpc_type_info(rpc_in)
                 out_type, out_type_range = self._extract_rpc_type_info(
@@ -499,7 +982,7 @@ class Indexer:
                     out_type_range=out_type_range,
                     throw_type_range=throw_type_range,
                 ))
-        return rpcs
+        return tuple(rpcs)
 
     def _extract_rpc_type_ref(
         self, rpc_clause: Optional[ts.Node],
@@ -514,19 +997,20 @@ class Indexer:
         """Extract (type_ref, range) from rpc in/out/throw."""
         if rpc_clause is None:
             return None, None
+        clause_parts = _first_children(rpc_clause, _RPC_CLAUSE_PARTS)
         # If it has an argument_list, it's an inline struct, no single ref
-        if _find_child(rpc_clause, 'argument_list'):
+        if 'argument_list' in clause_parts:
             return None, None
-        type_node = _find_child(rpc_clause, 'type')
+        type_node = clause_parts.get('type')
         if type_node:
-            text = _node_text(type_node)
+            text = _interned_text(type_node)
             if text and text not in BUILTIN_TYPES and text not in (
                 'null', 'void'
             ):
                 return text, _node_range(type_node)
-        id_node = _find_identifier(rpc_clause)
+        id_node = clause_parts.get('identifier')
         if id_node:
-            text = _node_text(id_node)
+            text = _interned_text(id_node)
             if text and text not in BUILTIN_TYPES and text not in (
                 'null', 'void'
             ):
@@ -535,21 +1019,21 @@ class Indexer:
 
     def _extract_module_fields(
         self, block: ts.Node,
-    ) -> list[FieldSymbol]:
+    ) -> tuple[FieldSymbol, ...]:
         fields = []
         for child in block.children:
-            if child.type == 'module_field':
+            if child.kind_id in _MODULE_FIELD_KINDS:
                 ids = _find_children(child, 'identifier')
                 if len(ids) >= 2:
                     type_id = ids[0]  # interface type
                     name_id = ids[1]  # field name
                     fields.append(FieldSymbol(
                         name=_node_text(name_id) or '',
-                        type_ref=_node_text(type_id),
+                        type_ref=_interned_text(type_id),
                         specifier=None,
                         default_value=None,
                         range=_node_range(name_id),
                         doc=get_field_doc_comment(child),
                         full_range=_node_range(child),
                     ))
-        return fields
+        return tuple(fields)
@@ -3,18 +3,28 @@
 from __future__ import annotations
 
 import argparse
+import asyncio
 import logging
+import os
 import re
-from typing import Optional
+import uuid
+from functools import lru_cache
+from typing import NamedTuple, Optional
+from urllib.parse import unquote
 
 import tree_sitter as ts
 from lsprotocol import types as lsp
+from pygls import uris
 from pygls.lsp.server import LanguageServer
 
 from .c_mapping import camelcase_to_c
-from .indexer import BUILTIN_TYPES, IOP_LANGUAGE, Indexer, _find_child
+from .doc_comments import get_field_doc_comment
+from .indexer import (
+    BUILTIN_TYPES, IOP_LANGUAGE, Indexer, TreeEdit, _find_child,
+    _find_identifier,
+)
 from .symbols import (
-    EnumValueSymbol, Symbol, SymbolKind,
+    EnumValueSymbol, Range as IopRange, Symbol, SymbolKind,
 )
 
 log = logging.getLogger(__name__)
@@ -34,11 +44,63 @@ _REFERENCE_QUERY = ts.Query(IOP_LANGUAGE, """
 """)
 
 
+def _document_key(uri: str) -> str:
+    """Key of a document in the caches below.
+
+    URIs are unquoted like the pygls workspace does, as clients and
+    _path_to_uri() may quote the same path differently.
+    """
+    return unquote(uri)
+
+
+# document key -> (version, source, tree) of the last parse of each open
+# document
+_tree_cache: dict[str, tuple[Optional[int], bytes, ts.Tree]] = {}
+
+
 def _get_tree(uri: str) -> Optional[ts.Tree]:
-    """Parse the current document content."""
+    """Get the tree of the current document content."""
+    return _get_document(uri)[1]
+
+
+def _get_document(uri: str) -> tuple[bytes, ts.Tree]:
+    """Get the UTF-8 source and tree of the current document content.
+
+    The document is only encoded and parsed again when its version
+    changed since the last call.
+    """
     doc = server.workspace.get_text_document(uri)
+    cached = _tree_cache.get(_document_key(uri))
+    if (cached is not None and doc.version is not None
+            and cached[0] == doc.version):
+        return cached[1], cached[2]
     source = doc.source.encode('utf-8')
-    return _parser.parse(source)
+    if doc.version is None:
+        # Not an open document: no did_close would evict it from the cache
+        return source, _parser.parse(source)
+    return source, _parse_document(uri, doc.version, source)
+
+
+def _parse_document(
+    uri: str, version: Optional[int], source: bytes,
+) -> ts.Tree:
+    """Parse a document, reusing its previous tree when there is one.
+
+    The cached tree is edited to match the new source so tree-sitter only
+    re-parses the changed region.
+    """
+    key = _document_key(uri)
+    cached = _tree_cache.get(key)
+    if cached is None:
+        tree = _parser.parse(source)
+    else:
+        _, old_source, tree = cached
+        edit = TreeEdit.between(old_source, source)
+        if edit is not None:
+            edit.apply(tree)
+            tree = _parser.parse(source, tree)
+    _tree_cache[key] = (version, source, tree)
+    return tree
 
 
 def _get_package_for_uri(uri: str) -> Optional[str]:
@@ -47,11 +109,16 @@ def _get_package_for_uri(uri: str) -> Optional[str]:
     return indexer.index.package_of_file.get(path)
 
 
+@lru_cache(maxsize=4096)
 def _uri_to_path(uri: str) -> str:
     """Convert a file URI to an absolute path."""
-    if uri.startswith('file://'):
-        return uri[7:]
-    return uri
+    return uris.to_fs_path(uri) or uri
+
+
+@lru_cache(maxsize=4096)
+def _path_to_uri(path: str) -> str:
+    """Convert an absolute path to a file URI."""
+    return uris.from_fs_path(path) or f'file://{path}'
 
 
 _C_WORD_RE = re.compile(r'[a-zA-Z_][a-zA-Z0-9_]*')
@@ -229,40 +296,61 @@ def _node_at_position(
     return node
 
 
+# Parents whose identifier children are all type references
+_TYPE_REF_PARENTS = frozenset((
+    'class_inheritance', 'rpc_in', 'rpc_out', 'rpc_throw',
+))
+
+
 def _is_type_reference_context(node: ts.Node) -> bool:
     """Check if a node is in a type reference context."""
-    if node.type != 'identifier' and node.type != 'type':
-        return False
-
     parent = node.parent
     if parent is None:
         return False
+    return _is_type_reference(node, node.type, parent, parent.type)
+
+
+def _is_type_reference(
+    node: ts.Node, node_type: str, parent: ts.Node, parent_type: str,
+) -> bool:
+    """Like _is_type_reference_context, with the node types already read."""
+    if node_type != 'identifier' and node_type != 'type':
+        return False
 
     # identifier inside a 'type' node (field type)
-    if node.type == 'identifier' and parent.type == 'type':
+    if node_type == 'identifier' and parent_type == 'type':
         return True
 
     # 'type' node inside a 'variable' (field/arg type)
-    if node.type == 'type' and parent.type == 'variable':
-        return True
-
-    # class_inheritance -> identifier (parent class ref)
-    if parent.type == 'class_inheritance':
+    if node_type == 'type' and parent_type == 'variable':
         return True
 
+    # class_inheritance -> identifier (parent class ref), and
     # rpc_in/rpc_out/rpc_throw -> identifier (single type ref)
-    if parent.type in ('rpc_in', 'rpc_out', 'rpc_throw'):
+    if parent_type in _TYPE_REF_PARENTS:
         return True
 
     # module_field: first identifier is the type
-    if parent.type == 'module_field':
-        ids = [c for c in parent.children if c.type == 'identifier']
-        if ids and node.id == ids[0].id:
-            return True
+    if parent_type == 'module_field':
+        type_id = _find_identifier(parent)
+        return type_id is not None and type_id.id == node.id
 
     return False
 
 
+def _request_text(node: ts.Node) -> Optional[str]:
+    """Get the text a definition or hover request at node is about.
+
+    For a type node this is the text of its identifier.
+    """
+    if node.type == 'type':
+        id_node = _find_identifier(node)
+        if id_node is not None:
+            node = id_node
+    text = node.text
+    return text.decode('utf-8') if text else None
+
+
 def _get_type_ref_at_position(
     tree: ts.Tree, line: int, col: int,
 ) -> Optional[str]:
@@ -271,9 +359,10 @@ def _get_type_ref_at_position(
     if node is None:
         return None
 
-    text = node.text.decode('utf-8') if node.text else None
-    if text is None:
+    raw = node.text
+    if not raw:
         return None
+    text = raw.decode('utf-8')
 
     # Check if it's in a type context
     if _is_type_reference_context(node):
@@ -293,6 +382,21 @@ def _get_type_ref_at_position(
     return None
 
 
+# Context of an identifier, by the type of its parent node
+_IDENTIFIER_CONTEXTS: dict[str, str] = {
+    'enum_field': 'enum_value_def',
+    'data_structure_definition': 'type_def',
+    'class_definition': 'type_def',
+    'enum_definition': 'type_def',
+    'interface_definition': 'type_def',
+    'module_definition': 'type_def',
+    'snmp_object_definition': 'type_def',
+    'snmp_table_definition': 'type_def',
+    'snmp_interface_definition': 'type_def',
+    'rpc': 'rpc_name',
+}
+
+
 def _get_node_context_at_position(
     tree: ts.Tree, line: int, col: int,
 ) -> tuple[Optional[ts.Node], str]:
@@ -306,96 +410,210 @@ def _get_node_context_at_position(
     if node is None:
         return None, 'unknown'
 
+    node_type = node.type
+
     # doc_ref is an atomic token with no children
-    if node.type == 'doc_ref':
+    if node_type == 'doc_ref':
         return node, 'doc_ref'
 
     parent = node.parent
+    if parent is not None:
+        parent_type = parent.type
 
-    if _is_type_reference_context(node):
-        return node, 'type_ref'
+        if _is_type_reference(node, node_type, parent, parent_type):
+            return node, 'type_ref'
 
-    if node.type == 'identifier' and parent:
-        # Enum value in default_value
-        if parent.type == 'value' or (
-            parent.parent and parent.parent.type == 'default_value'
-        ):
-            return node, 'enum_value'
-
-        # Field name (identifier in a variable, but not the type)
-        if parent.type == 'variable':
-            type_node = _find_child(parent, 'type')
-            if type_node and node.id != type_node.id:
-                # This is the field name identifier
-                return node, 'field_name'
-
-        # Enum value definition (identifier in enum_field)
-        if parent.type == 'enum_field':
-            return node, 'enum_value_def'
-
-        # Type name definition
-        if parent.type in (
-            'data_structure_definition', 'class_definition',
-            'enum_definition', 'interface_definition',
-            'module_definition', 'snmp_object_definition',
-            'snmp_table_definition', 'snmp_interface_definition',
-        ):
-            return node, 'type_def'
-
-        # RPC name
-        if parent.type == 'rpc':
-            return node, 'rpc_name'
+        if node_type == 'identifier':
+            grandparent = parent.parent
 
-    if node.type == 'type':
+            # Enum value in default_value
+            if parent_type == 'value' or (
+                grandparent and grandparent.type == 'default_value'
+            ):
+                return node, 'enum_value'
+
+            # Field name (identifier in a variable, but not the type)
+            if parent_type == 'variable':
+                type_node = _find_child(parent, 'type')
+                if type_node and node.id != type_node.id:
+                    # This is the field name identifier
+                    return node, 'field_name'
+
+            # Enum value definition, type name definition or RPC name
+            context = _IDENTIFIER_CONTEXTS.get(parent_type)
+            if context is not None:
+                return node, context
+
+    if node_type == 'type':
         # 'type' node that's a builtin - could still be hovered
         return node, 'type_ref'
 
     return node, 'unknown'
 
 
+class _RequestContext(NamedTuple):
+    """What a request at a position of an open document is about."""
+    tree: ts.Tree
+    node: ts.Node
+    context: str  # as returned by _get_node_context_at_position
+    text: str  # as returned by _request_text
+
+
+# document key -> (version, {(line, col): request context}) for open
+# documents
+_context_cache: dict[
+    str, tuple[int, dict[tuple[int, int], Optional[_RequestContext]]]
+] = {}
+# Max cached positions per document version
+_CONTEXT_CACHE_SIZE = 2048
+
+
+def _get_request_context(
+    uri: str, line: int, col: int,
+) -> Optional[_RequestContext]:
+    """Get the document tree, and the node, context and text at position.
+
+    None is returned where no request has anything to do: outside of any
+    node or in an 'unknown' context, e.g. in whitespace or a comment.
+
+    Results are memoized per document version, as clients often send
+    several requests for the same position (hover, then definition); a
+    memoized position does not even look the tree up.
+    """
+    version = server.workspace.get_text_document(uri).version
+    key = _document_key(uri)
+    cached = _context_cache.get(key) if version is not None else None
+    if cached is not None and cached[0] == version:
+        positions = cached[1]
+        if (line, col) in positions:
+            return positions[(line, col)]
+
+    tree = _get_tree(uri)
+    if tree is None:
+        return None
+    node, context = _get_node_context_at_position(tree, line, col)
+    result = None
+    # Bail out before decoding the node: in whitespace, the node is the
+    # enclosing block, or even the whole file.
+    if node is not None and context != 'unknown':
+        text = _request_text(node)
+        if text is not None:
+            result = _RequestContext(tree, node, context, text)
+
+    if version is not None:
+        if cached is None or cached[0] != version:
+            cached = (version, {})
+            _context_cache[key] = cached
+        positions = cached[1]
+        if len(positions) >= _CONTEXT_CACHE_SIZE:
+            positions.clear()
+        positions[(line, col)] = result
+    return result
+
+
+# Delay before re-indexing a document after its last change, in seconds
+_REINDEX_DELAY = 0.15
+
+# uri -> re-index scheduled by did_change and not run yet
+_pending_reindex: dict[str, asyncio.TimerHandle] = {}
+
+
+def _cancel_reindex(uri: str) -> None:
+    """Cancel the pending re-index of a document, if any."""
+    handle = _pending_reindex.pop(uri, None)
+    if handle is not None:
+        handle.cancel()
+
+
+def _reindex(uri: str, source: bytes) -> None:
+    """Re-index a document and publish its diagnostics."""
+    _pending_reindex.pop(uri, None)
+    indexer.index_source(_uri_to_path(uri), source)
+    _publish_diagnostics(uri)
+
+
+def _schedule_reindex(uri: str, source: bytes) -> None:
+    """Re-index a document once it has not changed for _REINDEX_DELAY.
+
+    Requests served meanwhile use the last completed index.
+    """
+    _cancel_reindex(uri)
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        _reindex(uri, source)
+        return
+    _pending_reindex[uri] = loop.call_later(
+        _REINDEX_DELAY, _reindex, uri, source,
+    )
+
+
 @server.feature(lsp.TEXT_DOCUMENT_DID_OPEN)
 def did_open(params: lsp.DidOpenTextDocumentParams) -> None:
-    path = _uri_to_path(params.text_document.uri)
+    uri = params.text_document.uri
+    path = _uri_to_path(uri)
     source = params.text_document.text.encode('utf-8')
+    _cancel_reindex(uri)
+    _tree_cache.pop(_document_key(uri), None)
+    _context_cache.pop(_document_key(uri), None)
+    _parse_document(uri, params.text_document.version, source)
     indexer.index_source(path, source)
-    _publish_diagnostics(params.text_document.uri)
+    _publish_diagnostics(uri)
+
+
+@server.feature(lsp.TEXT_DOCUMENT_DID_CLOSE)
+def did_close(params: lsp.DidCloseTextDocumentParams) -> None:
+    # Unsaved changes are dropped with the buffer: index the file content
+    # on disk again, instead of the last (maybe pending) buffer state.
+    uri = params.text_document.uri
+    _cancel_reindex(uri)
+    _tree_cache.pop(_document_key(uri), None)
+    _context_cache.pop(_document_key(uri), None)
+    indexer.index_file(_uri_to_path(uri))
 
 
 @server.feature(lsp.TEXT_DOCUMENT_DID_SAVE)
 def did_save(params: lsp.DidSaveTextDocumentParams) -> None:
     path = _uri_to_path(params.text_document.uri)
+    _cancel_reindex(params.text_document.uri)
     indexer.index_file(path)
     _publish_diagnostics(params.text_document.uri)
 
 
 @server.feature(lsp.TEXT_DOCUMENT_DID_CHANGE)
 def did_change(params: lsp.DidChangeTextDocumentParams) -> None:
-    # Re-index from the latest content
-    doc = server.workspace.get_text_document(
-        params.text_document.uri
-    )
-    path = _uri_to_path(params.text_document.uri)
+    # Re-parse from the latest content (pygls has already applied the
+    # incremental changes to the workspace document). Re-indexing is
+    # debounced so a burst of keystrokes only re-indexes the file once.
+    uri = params.text_document.uri
+    doc = server.workspace.get_text_document(uri)
     source = doc.source.encode('utf-8')
-    indexer.index_source(path, source)
-    _publish_diagnostics(params.text_document.uri)
+    _parse_document(uri, doc.version, source)
+    _schedule_reindex(uri, source)
 
 
 def _find_references_in_file(
     filepath: str,
     source: bytes,
     target_names: set[str],
+    tree: Optional[ts.Tree] = None,
 ) -> list[lsp.Location]:
-    """Find all references to target_names in a single file's source."""
-    tree = _parser.parse(source)
+    """Find all references to target_names in a single file's source.
+
+    The source is parsed unless its tree is given.
+    """
+    if tree is None:
+        tree = _parser.parse(source)
     root = tree.root_node
     locations: list[lsp.Location] = []
     cursor = ts.QueryCursor(_REFERENCE_QUERY)
+    # Compare the raw node text so non-matching nodes are never decoded
+    targets = {name.encode('utf-8') for name in target_names}
 
     for pattern_idx, match in cursor.matches(root):
         for capture_name, nodes in match.items():
             for node in nodes:
-                text = node.text.decode('utf-8') if node.text else None
-                if text is None or text not in target_names:
+                if node.text not in targets:
                     continue
                 # For module_field (pattern index 5), skip the field name
                 # (second identifier) — only the first is the type reference
@@ -409,7 +627,7 @@ def _find_references_in_file(
                 sp = node.start_point
                 ep = node.end_point
                 locations.append(lsp.Location(
-                    uri=f'file://{filepath}',
+                    uri=_path_to_uri(filepath),
                     range=lsp.Range(
                         start=lsp.Position(line=sp.row, character=sp.column),
                         end=lsp.Position(line=ep.row, character=ep.column),
@@ -430,19 +648,19 @@ def _find_all_references(
         locations.append(_symbol_to_location(sym))
 
     for filepath in indexer.index.by_file:
-        # Try to get source from open documents first
-        uri = f'file://{filepath}'
-        try:
-            doc = server.workspace.get_text_document(uri)
-            source = doc.source.encode('utf-8')
-        except Exception:
+        # Open documents: use their current content and parsed tree
+        uri = _path_to_uri(filepath)
+        if server.workspace.get_text_document(uri).version is not None:
+            source, tree = _get_document(uri)
+        else:
             try:
                 with open(filepath, 'rb') as f:
                     source = f.read()
             except OSError:
                 continue
+            tree = None
         locations.extend(
-            _find_references_in_file(filepath, source, target_names)
+            _find_references_in_file(filepath, source, target_names, tree)
         )
     return locations
 
@@ -455,24 +673,10 @@ def find_references(
     line = params.position.line
     col = params.position.character
 
-    tree = _get_tree(uri)
-    if tree is None:
+    request = _get_request_context(uri, line, col)
+    if request is None:
         return None
-
-    node, context = _get_node_context_at_position(tree, line, col)
-    if node is None:
-        return None
-
-    text = node.text.decode('utf-8') if node.text else None
-    if text is None:
-        return None
-
-    # For type nodes, get the identifier text
-    if node.type == 'type':
-        for child in node.children:
-            if child.type == 'identifier':
-                text = child.text.decode('utf-8')
-                break
+    tree, node, context, text = request
 
     current_package = _get_package_for_uri(uri)
     sym: Optional[Symbol] = None
@@ -499,11 +703,7 @@ def find_references(
             if iface_node:
                 iface_node = iface_node.parent  # interface_definition
             if iface_node:
-                iface_id = None
-                for child in iface_node.children:
-                    if child.type == 'identifier':
-                        iface_id = child
-                        break
+                iface_id = _find_identifier(iface_node)
                 if iface_id:
                     iface_name = iface_id.text.decode('utf-8')
                     sym = indexer.index.resolve(
@@ -536,25 +736,10 @@ def goto_definition(
                 return _symbol_to_location(sym)
         return None
 
-    tree = _get_tree(uri)
-    if tree is None:
-        return None
-
-    node, context = _get_node_context_at_position(tree, line, col)
-    if node is None:
-        return None
-
-    text = node.text.decode('utf-8') if node.text else None
-    if text is None:
+    request = _get_request_context(uri, line, col)
+    if request is None:
         return None
-
-    # For type nodes, get the text content
-    if node.type == 'type':
-        # Get the identifier child if any
-        for child in node.children:
-            if child.type == 'identifier':
-                text = child.text.decode('utf-8')
-                break
+    tree, node, context, text = request
 
     current_package = _get_package_for_uri(uri)
 
@@ -568,7 +753,7 @@ def goto_definition(
         if result:
             enum_sym, enum_val = result
             return lsp.Location(
-                uri=f'file://{enum_sym.file}',
+                uri=_path_to_uri(enum_sym.file),
                 range=_range_to_lsp(enum_val.range),
             )
 
@@ -595,6 +780,18 @@ def goto_definition(
     return None
 
 
+# Hovers of the built-in types, which do not depend on the document
+_BUILTIN_HOVERS: dict[str, lsp.Hover] = {
+    t: lsp.Hover(
+        contents=lsp.MarkupContent(
+            kind=lsp.MarkupKind.Markdown,
+            value=f'**{t}** (built-in type)',
+        ),
+    )
+    for t in BUILTIN_TYPES
+}
+
+
 @server.feature(lsp.TEXT_DOCUMENT_HOVER)
 def hover(params: lsp.HoverParams) -> Optional[lsp.Hover]:
     uri = params.text_document.uri
@@ -616,35 +813,19 @@ def hover(params: lsp.HoverParams) -> Optional[lsp.Hover]:
                 )
         return None
 
-    tree = _get_tree(uri)
-    if tree is None:
-        return None
-
-    node, context = _get_node_context_at_position(tree, line, col)
-    if node is None:
+    request = _get_request_context(uri, line, col)
+    if request is None:
         return None
+    tree, node, context, text = request
 
-    text = node.text.decode('utf-8') if node.text else None
-    if text is None:
-        return None
-
-    # For type nodes, get the actual type text
-    if node.type == 'type':
-        for child in node.children:
-            if child.type == 'identifier':
-                text = child.text.decode('utf-8')
-                break
+    if context == 'type_ref':
+        builtin_hover = _BUILTIN_HOVERS.get(text)
+        if builtin_hover is not None:
+            return builtin_hover
 
     current_package = _get_package_for_uri(uri)
 
     if context == 'type_ref':
-        if text in BUILTIN_TYPES:
-            return lsp.Hover(
-                contents=lsp.MarkupContent(
-                    kind=lsp.MarkupKind.Markdown,
-                    value=f'**{text}** (built-in type)',
-                ),
-            )
         sym = indexer.index.resolve(text, current_package)
         if sym:
             return lsp.Hover(
@@ -804,7 +985,7 @@ def workspace_symbol(
             name=sym.name,
             kind=lsp_kind,
             location=lsp.Location(
-                uri=f'file://{sym.file}',
+                uri=_path_to_uri(sym.file),
                 range=_range_to_lsp(sym.range),
             ),
             container_name=sym.package,
@@ -1085,37 +1266,44 @@ def completion(
 
 
 def _format_symbol_hover(sym: Symbol) -> str:
-    """Format a symbol for hover display."""
-    kind_str = sym.kind.value
-    parts = [f'**{kind_str} {sym.name}**']
+    """Format a symbol for hover display.
 
-    if sym.kind == SymbolKind.CLASS and sym.parent_class:
-        parts[0] += f' : {sym.parent_class}'
+    The result is kept on the symbol. It never goes stale: re-indexing a
+    file only keeps the symbol objects that compare equal to the new ones
+    (see SymbolIndex.replace_file()), and hover_markdown is excluded from
+    that comparison.
+    """
+    if sym.hover_markdown is None:
+        sym.hover_markdown = _render_symbol_hover(sym)
+    return sym.hover_markdown
 
-    if sym.kind == SymbolKind.TYPEDEF and sym.typedef_source:
-        parts[0] = f'**typedef** {sym.typedef_source} → **{sym.name}**'
 
-    parts.append(f'*(package: {sym.package})*')
+def _render_symbol_hover(sym: Symbol) -> str:
+    if sym.kind == SymbolKind.TYPEDEF and sym.typedef_source:
+        header = f'**typedef** {sym.typedef_source} → **{sym.name}**'
+    elif sym.kind == SymbolKind.CLASS and sym.parent_class:
+        header = f'**{sym.kind.value} {sym.name}** : {sym.parent_class}'
+    else:
+        header = f'**{sym.kind.value} {sym.name}**'
+    parts = [header, f'*(package: {sym.package})*']
 
     if sym.doc:
-        parts.append('')
-        parts.append(sym.doc)
+        parts += ('', sym.doc)
 
     # Show fields/values summary for small types
     if sym.enum_values:
-        parts.append('')
-        parts.append('```iop')
-        for ev in sym.enum_values:
-            val_str = f' = {ev.value}' if ev.value else ''
-            parts.append(f'  {ev.name}{val_str},')
+        parts += ('', '```iop')
+        parts += [
+            f'  {ev.name} = {ev.value},' if ev.value else f'  {ev.name},'
+            for ev in sym.enum_values
+        ]
         parts.append('```')
     elif sym.fields and len(sym.fields) <= 10:
-        parts.append('')
-        parts.append('```iop')
-        for f in sym.fields:
-            spec = f.specifier or ''
-            type_str = f.type_ref or 'builtin'
-            parts.append(f'  {type_str}{spec} {f.name};')
+        parts += ('', '```iop')
+        parts += [
+            f'  {f.type_ref or "builtin"}{f.specifier or ""} {f.name};'
+            for f in sym.fields
+        ]
         parts.append('```')
 
     return '\n'.join(parts)
@@ -1159,7 +1347,6 @@ def _format_field_hover_from_node(
     # For now, just show the type info
     field_parent = var_node.parent  # the 'field' node
     if field_parent and field_parent.type == 'field':
-        from .doc_comments import get_field_doc_comment
         doc = get_field_doc_comment(field_parent)
         if doc:
             parts.append('')
@@ -1186,15 +1373,16 @@ def _format_enum_value_def_hover(
 
 def _symbol_to_location(sym: Symbol) -> lsp.Location:
     return lsp.Location(
-        uri=f'file://{sym.file}',
+        uri=_path_to_uri(sym.file),
         range=_range_to_lsp(sym.range),
     )
 
 
-def _range_to_lsp(r) -> lsp.Range:
+def _range_to_lsp(r: IopRange) -> lsp.Range:
+    start_line, start_col, end_line, end_col = r
     return lsp.Range(
-        start=lsp.Position(line=r.start_line, character=r.start_col),
-        end=lsp.Position(line=r.end_line, character=r.end_col),
+        start=lsp.Position(line=start_line, character=start_col),
+        end=lsp.Position(line=end_line, character=end_col),
     )
 
 
@@ -1257,13 +1445,48 @@ def _unresolved_type_diag(type_ref: str, r) -> lsp.Diagnostic:
     )
 
 
+def _index_workspace_folder(path: str, with_progress: bool) -> None:
+    """Index a workspace folder, with its own work-done progress."""
+    log.info('Indexing workspace folder: %s', path)
+    if not with_progress:
+        indexer.index_workspace(path)
+        return
+
+    # The token is created without waiting for the client's answer, see
+    # on_initialized().
+    token = str(uuid.uuid4())
+    server.work_done_progress.create(token)
+    server.work_done_progress.begin(token, lsp.WorkDoneProgressBegin(
+        title=f'Indexing IOP files in {os.path.basename(path) or path}',
+        percentage=0,
+    ))
+    last_percentage = 0
+
+    def report(done: int, total: int) -> None:
+        nonlocal last_percentage
+        percentage = done * 100 // total
+        if percentage == last_percentage:
+            return
+        last_percentage = percentage
+        server.work_done_progress.report(token, lsp.WorkDoneProgressReport(
+            message=f'{done}/{total} files', percentage=percentage,
+        ))
+
+    try:
+        indexer.index_workspace(path, report)
+    finally:
+        server.work_done_progress.end(token, lsp.WorkDoneProgressEnd())
+
+
 @server.feature(lsp.INITIALIZED)
 def on_initialized(params: lsp.InitializedParams) -> None:
     """Index the workspace when the server is initialized."""
+    # Synchronous on purpose: no other message is handled until the
+    # index is complete.
+    window = server.client_capabilities.window
+    with_progress = window is not None and bool(window.work_done_progress)
     for folder in server.workspace.folders.values():
-        path = _uri_to_path(folder.uri)
-        log.info('Indexing workspace folder: %s', path)
-        indexer.index_workspace(path)
+        _index_workspace_folder(_uri_to_path(folder.uri), with_progress)
 
 
 def main() -> None:
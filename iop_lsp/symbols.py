@@ -4,7 +4,7 @@ from __future__ import annotations
 
 from dataclasses import dataclass, field
 from enum import Enum
-from typing import Optional
+from typing import NamedTuple, Optional
 
 
 class SymbolKind(Enum):
@@ -20,15 +20,14 @@ class SymbolKind(Enum):
     SNMP_IFACE = 'snmpIface'
 
 
-@dataclass
-class Range:
+class Range(NamedTuple):
     start_line: int  # 0-indexed
     start_col: int
     end_line: int
     end_col: int
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class FieldSymbol:
     name: str
     type_ref: Optional[str]  # Referenced type name (None for built-ins)
@@ -40,7 +39,7 @@ class FieldSymbol:
     type_range: Optional[Range] = None  # Range of the type name token
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class RpcSymbol:
     name: str
     in_type: Optional[str]  # Single type ref, or None if arg list/void
@@ -54,7 +53,7 @@ class RpcSymbol:
     throw_type_range: Optional[Range] = None
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class EnumValueSymbol:
     name: str
     value: Optional[str]
@@ -63,7 +62,7 @@ class EnumValueSymbol:
     full_range: Optional[Range] = None  # Range of the entire enum_field node
 
 
-@dataclass
+@dataclass(slots=True)
 class Symbol:
     name: str  # Simple name (e.g., 'LogLevel')
     qualified_name: str  # Package-qualified (e.g., 'core.LogLevel')
@@ -74,9 +73,9 @@ class Symbol:
     package: str
     parent_class: Optional[str]  # For classes, the parent class name
     full_range: Optional[Range] = None  # Range of the entire definition node
-    fields: list[FieldSymbol] = field(default_factory=list)
-    enum_values: list[EnumValueSymbol] = field(default_factory=list)
-    rpcs: list[RpcSymbol] = field(default_factory=list)
+    fields: tuple[FieldSymbol, ...] = ()
+    enum_values: tuple[EnumValueSymbol, ...] = ()
+    rpcs: tuple[RpcSymbol, ...] = ()
     # For typedef: the source type
     typedef_source: Optional[str] = None
     typedef_source_range: Optional[Range] = None
@@ -86,3 +85,11 @@ class Symbol:
     ctype: Optional[str] = None
     # @prefix override for enums (e.g., 'A' for @prefix(A))
     enum_prefix: Optional[str] = None
+    # C identifier base name (e.g., 'tstiop__my_struct_a')
+    c_name: Optional[str] = None
+    # @ctype override with its C type suffix stripped (e.g., 'http_code')
+    ctype_base: Optional[str] = None
+    # Hover markdown, formatted on first hover
+    hover_markdown: Optional[str] = field(
+        default=None, repr=False, compare=False,
+    )
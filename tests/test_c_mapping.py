@@ -6,6 +6,7 @@ from iop_lsp.c_mapping import (
     c_to_camelcase,
     camelcase_to_c,
     iop_type_to_c,
+    strip_c_type_suffix,
 )
 
 
@@ -34,6 +35,14 @@ class TestCamelcaseToC(unittest.TestCase):
     def test_digit_then_upper(self):
         self.assertEqual(camelcase_to_c('V2Request'), 'v2_request')
 
+    def test_already_lowercase(self):
+        self.assertEqual(camelcase_to_c('my_struct'), 'my_struct')
+
+    def test_acronym_run_before_word(self):
+        self.assertEqual(
+            camelcase_to_c('XMLHTTPRequest'), 'xmlhttp_request'
+        )
+
 
 class TestCToCamelcase(unittest.TestCase):
     def test_simple(self):
@@ -67,5 +76,25 @@ class TestIopTypeToC(unittest.TestCase):
         self.assertEqual(iop_type_to_c('foo.Bar'), 'foo__bar')
 
 
+class TestStripCTypeSuffix(unittest.TestCase):
+    def test_t_suffix(self):
+        self.assertEqual(
+            strip_c_type_suffix('tstiop__my_struct_a__t'),
+            'tstiop__my_struct_a',
+        )
+
+    def test_array_suffix(self):
+        self.assertEqual(
+            strip_c_type_suffix('tstiop__my_struct_a__array_t'),
+            'tstiop__my_struct_a',
+        )
+
+    def test_no_suffix(self):
+        self.assertEqual(
+            strip_c_type_suffix('tstiop__my_struct_a'),
+            'tstiop__my_struct_a',
+        )
+
+
 if __name__ == '__main__':
     unittest.main()
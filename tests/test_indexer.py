@@ -4,16 +4,34 @@ import os
 import tempfile
 import unittest
 
-from iop_lsp.indexer import Indexer
+from iop_lsp.indexer import Indexer, TreeEdit, extract_package
 from iop_lsp.symbols import SymbolKind
 
+# Source shared by the re-indexing tests
+FOO_A = b'package foo;\nstruct A {};'
+
+# core.iop of the lib-common checkout this repository lives in, if any
+CORE_IOP = os.path.normpath(os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '..', '..', '..',
+    'src', 'core', 'core.iop',
+))
+
+
+class _IndexerTestMixin:
+    """Fresh Indexer per test, with a helper to index str or bytes."""
 
-class TestIndexer(unittest.TestCase):
     def setUp(self):
         self.indexer = Indexer()
 
-    def _index_source(self, source: str, filename: str = '/test.iop'):
-        self.indexer.index_source(filename, source.encode('utf-8'))
+    def _index_source(self, source, filename: str = '/test.iop'):
+        if isinstance(source, str):
+            source = source.encode('utf-8')
+        self.indexer.index_source(filename, source)
+
+
+class TestIndexer(_IndexerTestMixin, unittest.TestCase):
+    def test_indexers_share_thread_parser(self):
+        self.assertIs(Indexer().parser, self.indexer.parser)
 
     def test_package_extraction(self):
         self._index_source('package foo;\nstruct Bar {};')
@@ -21,6 +39,16 @@ class TestIndexer(unittest.TestCase):
             self.indexer.index.package_of_file['/test.iop'], 'foo'
         )
 
+    def test_extract_package(self):
+        self.assertEqual(
+            extract_package(b'package foo;\nstruct X{};'), 'foo'
+        )
+        self.assertEqual(
+            extract_package(b'/* License */\n// x\npackage foo.bar;'),
+            'foo.bar',
+        )
+        self.assertIsNone(extract_package(b'struct X {};\npackage foo;'))
+
     def test_struct(self):
         self._index_source(
             'package foo;\n'
@@ -148,6 +176,29 @@ class TestIndexer(unittest.TestCase):
         )
         sym = self.indexer.index.resolve('Common', 'bar')
         self.assertEqual(sym.package, 'bar')
+        self.assertIs(sym, self.indexer.index.by_qualified_name['bar.Common'])
+        sym = self.indexer.index.resolve('Common', 'foo')
+        self.assertEqual(sym.package, 'foo')
+
+    def test_resolve_after_reindex(self):
+        self.assertIsNone(self.indexer.index.resolve('Common', 'bar'))
+        self._index_source(
+            'package foo;\nstruct Common {};', '/a.iop'
+        )
+        sym = self.indexer.index.resolve('Common', 'bar')
+        self.assertEqual(sym.package, 'foo')
+        self.assertIs(self.indexer.index.resolve('Common', 'bar'), sym)
+
+        self._index_source(
+            'package bar;\nstruct Common {};', '/b.iop'
+        )
+        self.assertEqual(
+            self.indexer.index.resolve('Common', 'bar').package, 'bar'
+        )
+        self.indexer.index.remove_file('/b.iop')
+        self.assertEqual(
+            self.indexer.index.resolve('Common', 'bar').package, 'foo'
+        )
 
     def test_resolve_enum_value(self):
         self._index_source(
@@ -164,12 +215,40 @@ class TestIndexer(unittest.TestCase):
         self.assertEqual(ev.name, 'HIGH')
         self.assertEqual(ev.value, '1')
 
+    def test_resolve_enum_value_prefers_same_package(self):
+        self._index_source(
+            'package foo;\nenum Level {\n    HIGH = 1,\n};', '/a.iop'
+        )
+        self._index_source(
+            'package bar;\nenum Level {\n    HIGH = 2,\n};', '/b.iop'
+        )
+        enum_sym, ev = self.indexer.index.resolve_enum_value('HIGH', 'bar')
+        self.assertEqual(enum_sym.package, 'bar')
+        self.assertEqual(ev.value, '2')
+
+    def test_resolve_enum_value_after_remove_file(self):
+        self._index_source(
+            'package foo;\nenum Level {\n    HIGH = 1,\n};', '/a.iop'
+        )
+        self.indexer.index.remove_file('/a.iop')
+        self.assertIsNone(
+            self.indexer.index.resolve_enum_value('HIGH', 'foo')
+        )
+
     def test_resolve_builtin_returns_none(self):
         sym = self.indexer.index.resolve('int')
         self.assertIsNone(sym)
 
+    def test_resolve_builtins_skip_the_cache(self):
+        from iop_lsp.indexer import BUILTIN_TYPES
+
+        index = self.indexer.index
+        for name in BUILTIN_TYPES:
+            self.assertIsNone(index.resolve(name, 'foo'))
+        self.assertEqual(index._resolve_cache, {})
+
     def test_reindex_file(self):
-        self._index_source('package foo;\nstruct A {};', '/a.iop')
+        self._index_source(FOO_A, '/a.iop')
         self.assertIn('foo.A', self.indexer.index.by_qualified_name)
 
         # Re-index with different content
@@ -177,58 +256,105 @@ class TestIndexer(unittest.TestCase):
         self.assertNotIn('foo.A', self.indexer.index.by_qualified_name)
         self.assertIn('foo.B', self.indexer.index.by_qualified_name)
 
-    def test_doc_comment(self):
+    def test_reindex_keeps_unchanged_symbols(self):
         self._index_source(
-            'package foo;\n'
-            '/** A test struct. */\n'
-            'struct Documented {};'
+            'package foo;\nstruct A {};\nstruct B {};', '/a.iop'
         )
-        sym = self.indexer.index.by_qualified_name['foo.Documented']
-        self.assertEqual(sym.doc, 'A test struct.')
-
-    def test_index_real_core_iop(self):
-        """Integration test: index the real core.iop file."""
-        core_iop = os.path.join(
-            os.path.dirname(__file__), '..', '..', '..',
-            'src', 'core', 'core.iop'
+        a = self.indexer.index.by_qualified_name['foo.A']
+        self._index_source(
+            'package foo;\nstruct A {};\nstruct C { int x; };', '/a.iop'
+        )
+        index = self.indexer.index
+        self.assertIs(index.by_qualified_name['foo.A'], a)
+        self.assertNotIn('foo.B', index.by_qualified_name)
+        self.assertIn('foo.C', index.by_qualified_name)
+        self.assertEqual(
+            [s.name for s in index.by_file['/a.iop']], ['A', 'C'],
         )
-        if not os.path.exists(core_iop):
-            self.skipTest('core.iop not found')
+        self.assertEqual(index.by_name['A'], [a])
 
-        self.indexer.index_file(core_iop)
+    def test_reindex_refreshes_cached_hover(self):
+        from iop_lsp.server import _format_symbol_hover
 
-        # Verify LogLevel enum exists
-        sym = self.indexer.index.by_qualified_name.get('core.LogLevel')
-        self.assertIsNotNone(sym, 'core.LogLevel not found')
-        self.assertEqual(sym.kind, SymbolKind.ENUM)
-        self.assertTrue(len(sym.enum_values) > 0)
+        self._index_source('package foo;\nstruct S { int x; };', '/a.iop')
+        sym = self.indexer.index.by_qualified_name['foo.S']
+        hover = _format_symbol_hover(sym)
+        self.assertIn('builtin x;', hover)
+        self.assertIs(_format_symbol_hover(sym), hover)
 
-        # Verify EMERG enum value
-        emerg = next(
-            (v for v in sym.enum_values if v.name == 'EMERG'), None
+        self._index_source('package foo;\nstruct S { int y; };', '/a.iop')
+        sym = self.indexer.index.by_qualified_name['foo.S']
+        hover = _format_symbol_hover(sym)
+        self.assertIn('builtin y;', hover)
+        self.assertNotIn('builtin x;', hover)
+
+    def test_reindex_incremental_edit(self):
+        self._index_source(FOO_A, '/a.iop')
+        # Rename 'A' (byte 20, row 1 col 7) to 'Abc'
+        self.indexer.index_source(
+            '/a.iop', b'package foo;\nstruct Abc {};',
+            TreeEdit(
+                start_byte=20, old_end_byte=21, new_end_byte=23,
+                start_point=(1, 7), old_end_point=(1, 8),
+                new_end_point=(1, 10),
+            ),
         )
-        self.assertIsNotNone(emerg)
-        self.assertEqual(emerg.value, '0')
+        self.assertNotIn('foo.A', self.indexer.index.by_qualified_name)
+        sym = self.indexer.index.by_qualified_name['foo.Abc']
+        self.assertEqual(sym.range.start_col, 7)
+        self.assertEqual(sym.range.end_col, 10)
+
+    def test_reindex_diffs_against_previous_source(self):
+        self._index_source(FOO_A, '/a.iop')
+        self._index_source('package foo;\nstruct Abc {};', '/a.iop')
+        sym = self.indexer.index.by_qualified_name['foo.Abc']
+        self.assertEqual(sym.range.start_col, 7)
+        self.assertEqual(sym.range.end_col, 10)
+
+    def test_reindex_unchanged_source_keeps_symbols(self):
+        self._index_source(FOO_A, '/a.iop')
+        sym = self.indexer.index.by_qualified_name['foo.A']
+        self._index_source(FOO_A, '/a.iop')
+        self.assertIs(self.indexer.index.by_qualified_name['foo.A'], sym)
+        self.assertEqual(len(self.indexer.index.by_name['A']), 1)
+
+    def test_index_file_unchanged_keeps_symbols(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'a.iop')
+            with open(path, 'wb') as f:
+                f.write(FOO_A)
+            self.indexer.index_file(path)
+            sym = self.indexer.index.by_qualified_name['foo.A']
+            self.indexer.index_file(path)
+            self.assertIs(self.indexer.index.by_qualified_name['foo.A'], sym)
+
+            with open(path, 'w') as f:
+                f.write('package foo;\nstruct B {};')
+            self.indexer.index_file(path)
+            self.assertNotIn('foo.A', self.indexer.index.by_qualified_name)
+            self.assertIn('foo.B', self.indexer.index.by_qualified_name)
+
+    def test_index_source_after_workspace_scan(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'a.iop')
+            with open(path, 'wb') as f:
+                f.write(FOO_A)
+            self.indexer.index_source(path, b'package foo;\nstruct B {};')
+            self.indexer.index_workspace(tmpdir)
+            self.assertIn('foo.A', self.indexer.index.by_qualified_name)
 
-        # Verify LoggerConfiguration struct
-        lc = self.indexer.index.by_qualified_name.get(
-            'core.LoggerConfiguration'
-        )
-        self.assertIsNotNone(lc)
-        self.assertEqual(lc.kind, SymbolKind.STRUCT)
+            self.indexer.index_source(path, b'package foo;\nstruct B {};')
+            self.assertNotIn('foo.A', self.indexer.index.by_qualified_name)
+            self.assertIn('foo.B', self.indexer.index.by_qualified_name)
 
-        # Verify field type references
-        level_field = next(
-            (f for f in lc.fields if f.name == 'level'), None
+    def test_doc_comment(self):
+        self._index_source(
+            'package foo;\n'
+            '/** A test struct. */\n'
+            'struct Documented {};'
         )
-        self.assertIsNotNone(level_field)
-        self.assertEqual(level_field.type_ref, 'LogLevel')
-
-        # Verify Log interface
-        log_iface = self.indexer.index.by_qualified_name.get('core.Log')
-        self.assertIsNotNone(log_iface)
-        self.assertEqual(log_iface.kind, SymbolKind.INTERFACE)
-        self.assertTrue(len(log_iface.rpcs) > 0)
+        sym = self.indexer.index.by_qualified_name['foo.Documented']
+        self.assertEqual(sym.doc, 'A test struct.')
 
     def test_index_workspace(self):
         """Test workspace indexing with temp directory."""
@@ -250,6 +376,40 @@ class TestIndexer(unittest.TestCase):
                 'sub.b.Bar', self.indexer.index.by_qualified_name
             )
 
+    def test_index_workspace_workers(self):
+        """Test that parallel and serial workspace indexing agree."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            for i in range(40):
+                with open(os.path.join(tmpdir, f'f{i}.iop'), 'w') as f:
+                    f.write(f'package p{i};\nstruct S{i} {{ int x; }};')
+
+            serial = Indexer()
+            serial.index_workspace(tmpdir, workers=1)
+            self.indexer.index_workspace(tmpdir, workers=4)
+
+            self.assertEqual(
+                self.indexer.index.by_qualified_name,
+                serial.index.by_qualified_name,
+            )
+            self.assertEqual(
+                self.indexer.index.package_of_file,
+                serial.index.package_of_file,
+            )
+
+    def test_index_workspace_progress(self):
+        """Test that workspace indexing reports progress per file."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            for name in ('a', 'b', 'c'):
+                with open(os.path.join(tmpdir, f'{name}.iop'), 'w') as f:
+                    f.write(f'package {name};\nstruct Foo {{}};')
+
+            calls = []
+            self.indexer.index_workspace(
+                tmpdir, lambda done, total: calls.append((done, total)),
+            )
+
+            self.assertEqual(calls, [(1, 3), (2, 3), (3, 3)])
+
     def test_field_type_reference(self):
         """Test that fields referencing custom types have type_ref set."""
         self._index_source(
@@ -266,6 +426,18 @@ class TestIndexer(unittest.TestCase):
         count_field = sym.fields[1]
         self.assertIsNone(count_field.type_ref)  # int is builtin
 
+    def test_type_refs_are_interned(self):
+        self._index_source(
+            'package foo;\nstruct A {\n    Color c;\n};', '/a.iop'
+        )
+        self._index_source(
+            'package bar;\nstruct B {\n    Color c;\n};', '/b.iop'
+        )
+        a = self.indexer.index.by_qualified_name['foo.A']
+        b = self.indexer.index.by_qualified_name['bar.B']
+        self.assertIs(a.fields[0].type_ref, b.fields[0].type_ref)
+        self.assertIs(a.fields[0].name, b.fields[0].name)
+
     def test_rpc_type_references(self):
         """Test RPC with single type in/out/throw."""
         self._index_source(
@@ -288,13 +460,88 @@ class TestIndexer(unittest.TestCase):
         self.assertEqual(rpc.throw_type, 'Err')
 
 
-class TestCIdentifierResolution(unittest.TestCase):
-    def setUp(self):
-        self.indexer = Indexer()
+class TestRealCoreIop(unittest.TestCase):
+    """Integration tests on the real core.iop file, indexed once."""
+
+    @classmethod
+    def setUpClass(cls):
+        if not os.path.isfile(CORE_IOP):
+            raise unittest.SkipTest('core.iop not found')
+
+        # The tests only read the index, so they can share it
+        cls.indexer = Indexer()
+        cls.indexer.index_file(CORE_IOP)
+
+    def test_log_level_enum(self):
+        sym = self.indexer.index.by_qualified_name.get('core.LogLevel')
+        self.assertIsNotNone(sym, 'core.LogLevel not found')
+        self.assertEqual(sym.kind, SymbolKind.ENUM)
+        self.assertTrue(len(sym.enum_values) > 0)
 
-    def _index_source(self, source: str, filename: str = '/test.iop'):
-        self.indexer.index_source(filename, source.encode('utf-8'))
+        # Verify EMERG enum value
+        result = self.indexer.index.resolve_enum_value('EMERG', 'core')
+        self.assertIsNotNone(result)
+        enum_sym, emerg = result
+        self.assertIs(enum_sym, sym)
+        self.assertEqual(emerg.value, '0')
+
+    def test_logger_configuration_struct(self):
+        lc = self.indexer.index.by_qualified_name.get(
+            'core.LoggerConfiguration'
+        )
+        self.assertIsNotNone(lc)
+        self.assertEqual(lc.kind, SymbolKind.STRUCT)
+
+        # Verify field type references
+        level_field = next(
+            (f for f in lc.fields if f.name == 'level'), None
+        )
+        self.assertIsNotNone(level_field)
+        self.assertEqual(level_field.type_ref, 'LogLevel')
+
+    def test_log_interface(self):
+        log_iface = self.indexer.index.by_qualified_name.get('core.Log')
+        self.assertIsNotNone(log_iface)
+        self.assertEqual(log_iface.kind, SymbolKind.INTERFACE)
+        self.assertTrue(len(log_iface.rpcs) > 0)
+
+
+class TestTreeEdit(unittest.TestCase):
+    def test_equal_sources(self):
+        self.assertIsNone(TreeEdit.between(b'package foo;', b'package foo;'))
+
+    def test_insertion(self):
+        edit = TreeEdit.between(
+            FOO_A, b'package foo;\nstruct Abc {};',
+        )
+        self.assertEqual(
+            (edit.start_byte, edit.old_end_byte, edit.new_end_byte),
+            (21, 21, 23),
+        )
+        self.assertEqual(edit.start_point, (1, 8))
+        self.assertEqual(edit.old_end_point, (1, 8))
+        self.assertEqual(edit.new_end_point, (1, 10))
 
+    def test_deletion_across_lines(self):
+        edit = TreeEdit.between(b'a\nbc\nd', b'a\nd')
+        self.assertEqual(
+            (edit.start_byte, edit.old_end_byte, edit.new_end_byte),
+            (2, 5, 2),
+        )
+        self.assertEqual(edit.start_point, (1, 0))
+        self.assertEqual(edit.old_end_point, (2, 0))
+        self.assertEqual(edit.new_end_point, (1, 0))
+
+    def test_multibyte_boundary(self):
+        # 'é' and 'è' share their first UTF-8 byte
+        edit = TreeEdit.between('aé'.encode(), 'aè'.encode())
+        self.assertEqual(
+            (edit.start_byte, edit.old_end_byte, edit.new_end_byte),
+            (1, 3, 3),
+        )
+
+
+class TestCIdentifierResolution(_IndexerTestMixin, unittest.TestCase):
     def test_resolve_with_t_suffix(self):
         self._index_source(
             'package tstiop;\n'
@@ -571,22 +818,23 @@ class TestDocRef(unittest.TestCase):
         self.assertIsNotNone(node)
 
 
-class TestDocComments(unittest.TestCase):
-    def setUp(self):
-        self.indexer = Indexer()
-
-    def _index_source(self, source: str, filename: str = '/test.iop'):
-        self.indexer.index_source(filename, source.encode('utf-8'))
-
-    def test_multiline_doc(self):
-        self._index_source(
-            'package foo;\n'
-            '/** Configuration of a specific logger.\n'
-            ' */\n'
-            'struct LoggerConfig {};'
-        )
-        sym = self.indexer.index.by_qualified_name['foo.LoggerConfig']
-        self.assertEqual(sym.doc, 'Configuration of a specific logger.')
+class TestDocComments(_IndexerTestMixin, unittest.TestCase):
+    def test_symbol_doc(self):
+        cases = [
+            ('/** Configuration of a specific logger.\n */\n',
+             'Configuration of a specific logger.'),
+            ('/** One line. */\n', 'One line.'),
+            ('', None),
+        ]
+        for comment, expected in cases:
+            with self.subTest(comment=comment):
+                self._index_source(
+                    'package foo;\n' + comment + 'struct LoggerConfig {};'
+                )
+                sym = self.indexer.index.by_qualified_name[
+                    'foo.LoggerConfig'
+                ]
+                self.assertEqual(sym.doc, expected)
 
     def test_trailing_doc_on_enum(self):
         self._index_source(
@@ -611,24 +859,10 @@ class TestDocComments(unittest.TestCase):
         sym = self.indexer.index.by_qualified_name['foo.S']
         self.assertEqual(sym.fields[0].doc, 'The name.')
 
-    def test_no_doc(self):
-        self._index_source(
-            'package foo;\n'
-            'struct S {};'
-        )
-        sym = self.indexer.index.by_qualified_name['foo.S']
-        self.assertIsNone(sym.doc)
 
-
-class TestDocumentSymbols(unittest.TestCase):
+class TestDocumentSymbols(_IndexerTestMixin, unittest.TestCase):
     """Tests for document symbol generation."""
 
-    def setUp(self):
-        self.indexer = Indexer()
-
-    def _index_source(self, source: str, filename: str = '/test.iop'):
-        self.indexer.index_source(filename, source.encode('utf-8'))
-
     def test_full_range_populated_on_symbol(self):
         self._index_source(
             'package foo;\n'
@@ -752,15 +986,9 @@ class TestDocumentSymbols(unittest.TestCase):
         self.assertIsNone(doc_sym.children)
 
 
-class TestWorkspaceSymbols(unittest.TestCase):
+class TestWorkspaceSymbols(_IndexerTestMixin, unittest.TestCase):
     """Tests for workspace symbol search."""
 
-    def setUp(self):
-        self.indexer = Indexer()
-
-    def _index_source(self, source: str, filename: str = '/test.iop'):
-        self.indexer.index_source(filename, source.encode('utf-8'))
-
     def test_empty_query_returns_all(self):
         from iop_lsp.server import _IOP_TO_LSP_KIND
         self._index_source(
@@ -866,11 +1094,11 @@ class TestWorkspaceSymbols(unittest.TestCase):
         return combined[:100] if combined else None
 
 
-class TestFindReferences(unittest.TestCase):
+class TestFindReferences(_IndexerTestMixin, unittest.TestCase):
     """Tests for Find References functionality."""
 
     def setUp(self):
-        self.indexer = Indexer()
+        super().setUp()
         self.parser = __import__(
             'tree_sitter', fromlist=['Parser']
         ).Parser(
@@ -879,9 +1107,6 @@ class TestFindReferences(unittest.TestCase):
             ).IOP_LANGUAGE
         )
 
-    def _index_source(self, source: str, filename: str = '/test.iop'):
-        self.indexer.index_source(filename, source.encode('utf-8'))
-
     def _find_refs(self, source: str, target_names: set,
                    filename: str = '/test.iop'):
         from iop_lsp.server import _find_references_in_file
@@ -1067,11 +1292,172 @@ class TestFindReferences(unittest.TestCase):
         self.assertEqual(len(refs), 2)
 
 
-class TestCompletion(unittest.TestCase):
+def _initialized_server():
+    """Return a fresh LanguageServer, initialized as by a client."""
+    from lsprotocol import types as lsp
+    from pygls.lsp.server import LanguageServer
+
+    ls = LanguageServer('iop-lsp-test', 'v0')
+    # The initialize handler is what creates the workspace
+    for _ in ls.protocol.lsp_initialize(lsp.InitializeParams(
+        capabilities=lsp.ClientCapabilities(),
+    )):
+        pass
+    return ls
+
+
+class _ServerTestMixin(_IndexerTestMixin):
+    """Run the server module against a fresh server and indexer.
+
+    Documents are opened and changed in the workspace first, then the
+    server's handler is called, as pygls does when dispatching.
+    """
+
+    def setUp(self):
+        super().setUp()
+        import iop_lsp.server as srv
+        self._orig_server = srv.server
+        self._orig_indexer = srv.indexer
+        srv.server = _initialized_server()
+        srv.indexer = self.indexer
+
+    def tearDown(self):
+        import iop_lsp.server as srv
+        srv.server = self._orig_server
+        srv.indexer = self._orig_indexer
+
+    def _open(self, uri: str, text: str):
+        import iop_lsp.server as srv
+        from lsprotocol import types as lsp
+        doc = lsp.TextDocumentItem(
+            uri=uri, language_id='iop', version=1, text=text,
+        )
+        srv.server.workspace.put_text_document(doc)
+        srv.did_open(lsp.DidOpenTextDocumentParams(text_document=doc))
+
+    def _change(self, uri: str, version: int, text: str):
+        import iop_lsp.server as srv
+        from lsprotocol import types as lsp
+        doc = lsp.VersionedTextDocumentIdentifier(uri=uri, version=version)
+        change = lsp.TextDocumentContentChangeWholeDocument(text=text)
+        srv.server.workspace.update_text_document(doc, change)
+        srv.did_change(lsp.DidChangeTextDocumentParams(
+            text_document=doc, content_changes=[change],
+        ))
+
+    def _close(self, uri: str):
+        import iop_lsp.server as srv
+        from lsprotocol import types as lsp
+        doc = lsp.TextDocumentIdentifier(uri=uri)
+        srv.server.workspace.remove_text_document(uri)
+        srv.did_close(lsp.DidCloseTextDocumentParams(text_document=doc))
+
+
+class TestUriConversion(_ServerTestMixin, unittest.TestCase):
+    """Tests for _uri_to_path and _path_to_uri."""
+
+    def test_round_trip(self):
+        from iop_lsp.server import _path_to_uri, _uri_to_path
+        path = '/work/my project/a#b.iop'
+        uri = _path_to_uri(path)
+        self.assertEqual(uri, 'file:///work/my%20project/a%23b.iop')
+        self.assertEqual(_uri_to_path(uri), path)
+
+    def test_open_document_under_quoted_path(self):
+        import iop_lsp.server as srv
+        # Not on disk: only found if looked up as an open document
+        path = '/work/my project/a+b@c.iop'
+        source = 'package foo;\nstruct A {};\nstruct B { A a; };'
+        # As sent by a client that does not quote the path
+        uri = 'file://' + path
+        self._open(uri, source)
+
+        self.assertEqual(
+            srv._get_document(srv._path_to_uri(path))[0], source.encode(),
+        )
+        sym = self.indexer.index.by_qualified_name['foo.A']
+        self.assertEqual(len(srv._find_all_references(sym, False)), 1)
+        self._close(uri)
+
+
+class TestDocumentSync(_ServerTestMixin, unittest.TestCase):
+    """Tests for re-indexing on didOpen/didChange/didSave/didClose."""
+
+    def setUp(self):
+        super().setUp()
+        import iop_lsp.server as srv
+        self._tmpdir = tempfile.TemporaryDirectory()
+        # A space makes the quoted and unquoted URIs differ
+        os.mkdir(os.path.join(self._tmpdir.name, 'my project'))
+        self.path = os.path.join(self._tmpdir.name, 'my project', 'a.iop')
+        self.uri = srv._path_to_uri(self.path)
+
+    def tearDown(self):
+        self._tmpdir.cleanup()
+        super().tearDown()
+
+    def _write(self, source: bytes):
+        with open(self.path, 'wb') as f:
+            f.write(source)
+
+    def _names(self):
+        return {
+            s.name for s in self.indexer.index.by_file.get(self.path, [])
+        }
+
+    def test_change_save_close(self):
+        import iop_lsp.server as srv
+        from lsprotocol import types as lsp
+        self._write(FOO_A)
+        self._open(self.uri, FOO_A.decode())
+        self.assertEqual(self._names(), {'A'})
+
+        # No running loop: _schedule_reindex re-indexes right away
+        self._change(self.uri, 2, 'package foo;\nstruct B {};')
+        self.assertEqual(self._names(), {'B'})
+
+        self._write(b'package foo;\nstruct C {};')
+        srv.did_save(lsp.DidSaveTextDocumentParams(
+            text_document=lsp.TextDocumentIdentifier(uri=self.uri),
+        ))
+        self.assertEqual(self._names(), {'C'})
+
+        # Unsaved changes are dropped on close
+        self._change(self.uri, 3, 'package foo;\nstruct D {};')
+        self.assertEqual(self._names(), {'D'})
+        self._close(self.uri)
+        self.assertEqual(self._names(), {'C'})
+
+    def test_unopened_document_not_cached(self):
+        import iop_lsp.server as srv
+        self._write(FOO_A)
+        source, tree = srv._get_document(self.uri)
+        self.assertEqual(source, FOO_A)
+        self.assertIsNotNone(tree)
+        self.assertNotIn(srv._document_key(self.uri), srv._tree_cache)
+
+    def test_references_in_open_document(self):
+        import iop_lsp.server as srv
+        source = 'package foo;\nstruct A {};\nstruct B { A a; };'
+        self._write(source.encode())
+        # Not quoted the way _path_to_uri() quotes it
+        uri = 'file://' + self.path
+        self._open(uri, source)
+        self._change(uri, 2, source.replace('A a;', 'A a; A b;'))
+
+        sym = self.indexer.index.by_qualified_name['foo.A']
+        locations = srv._find_all_references(sym, False)
+        self.assertEqual(len(locations), 2)
+
+        self._close(uri)
+        self.assertNotIn(srv._document_key(self.uri), srv._tree_cache)
+
+
+class TestCompletion(_IndexerTestMixin, unittest.TestCase):
     """Tests for completion context detection and candidate generation."""
 
     def setUp(self):
-        self.indexer = Indexer()
+        super().setUp()
         # Patch the module-level indexer used by completion functions
         import iop_lsp.server as srv
         self._orig_indexer = srv.indexer
@@ -1081,9 +1467,6 @@ class TestCompletion(unittest.TestCase):
         import iop_lsp.server as srv
         srv.indexer = self._orig_indexer
 
-    def _index_source(self, source: str, filename: str = '/test.iop'):
-        self.indexer.index_source(filename, source.encode('utf-8'))
-
     # --- Context detection tests ---
 
     def test_context_attribute(self):